@@ -0,0 +1,34 @@
+/**
+ * Rota "chatbot_lote" do WebApp da planilha da oficina.
+ *
+ * O chatbot junta as linhas (acessos, cadastros confirmados...) e manda um
+ * POST só: { secret, route: "chatbot_lote", linhas: [ {dados}, {dados}, ... ] }
+ * Cada item de "linhas" tem o mesmo formato de "dados" da rota "chatbot".
+ *
+ * Colar no doPost(e), logo depois da conferência do secret e antes da rota
+ * "chatbot". gravarLinhaChatbot(dados) é a função que a rota "chatbot" já usa
+ * para gravar uma linha (ajuste o nome se for diferente no seu projeto).
+ *
+ * A resposta traz um resultado por linha, na mesma ordem; o chatbot reenvia
+ * só as que voltarem com ok = false.
+ */
+if (body.route === "chatbot_lote") {
+  var lock = LockService.getScriptLock();
+  lock.waitLock(30000);
+  try {
+    var resultados = (body.linhas || []).map(function (dados) {
+      try {
+        gravarLinhaChatbot(dados);
+        return { ok: true };
+      } catch (err) {
+        return { ok: false, erro: String(err) };
+      }
+    });
+
+    return ContentService
+      .createTextOutput(JSON.stringify({ ok: true, resultados: resultados }))
+      .setMimeType(ContentService.MimeType.JSON);
+  } finally {
+    lock.releaseLock();
+  }
+}
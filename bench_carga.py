@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Teste de carga de ponta a ponta sem sair da máquina: sobe o graph_falso.py,
+aponta o bot para ele (GRAPH_API_BASE) e dispara conversas pelo POST
+/webhook do Flask, uma requisição por mensagem, como a Meta faz.
+
+Cada rodada manda uma mensagem de cada conversa ("oi", "1", nome) e espera
+as respostas. Mede a vazão e a latência do turno: webhook recebido ->
+resposta aceita pela Graph falsa.
+
+Uso: python bench_carga.py [conversas] [latencia_ms] [taxa_429] [taxa_erro]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+from graph_falso import GraphFalso
+
+_RODADAS = ["oi", "1", "Cliente Carga"]
+
+
+def _payload(numero, mensagem_id, texto):
+    return json.dumps({
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "0",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"phone_number_id": os.environ["WA_PHONE_NUMBER_ID"]},
+                    "contacts": [{"profile": {"name": "Cliente Carga"}, "wa_id": numero}],
+                    "messages": [{
+                        "from": numero,
+                        "id": mensagem_id,
+                        "timestamp": str(int(time.time())),
+                        "type": "text",
+                        "text": {"body": texto},
+                    }],
+                },
+            }],
+        }],
+    })
+
+
+def _percentis(amostras):
+    ordenados = sorted(amostras)
+    def p(x):
+        return ordenados[min(len(ordenados) - 1, int(x * len(ordenados)))] * 1000
+    return f"p50 {p(0.50):7.1f} ms | p95 {p(0.95):7.1f} ms | p99 {p(0.99):7.1f} ms | max {ordenados[-1] * 1000:7.1f} ms"
+
+
+def _aguardar_respostas(falso, numeros, esperadas, limite_s=120):
+    # Primeira resposta aceita de cada número nesta rodada (ts da Graph falsa)
+    fim = time.monotonic() + limite_s
+    while time.monotonic() < fim:
+        por_numero = {}
+        for chamada in list(falso.chamadas):
+            if chamada.caminho.endswith("/messages") and chamada.status == 200:
+                por_numero.setdefault(chamada.corpo.get("to"), []).append(chamada.ts)
+        if all(len(por_numero.get(n, [])) >= esperadas for n in numeros):
+            return {n: por_numero[n][esperadas - 1] for n in numeros}
+        time.sleep(0.02)
+    raise TimeoutError(f"respostas da rodada {esperadas} não chegaram em {limite_s}s")
+
+
+if __name__ == "__main__":
+    conversas = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latencia_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 80.0
+    taxa_429 = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    taxa_erro = float(sys.argv[4]) if len(sys.argv) > 4 else 0.0
+
+    falso = GraphFalso(
+        latencia_s=latencia_ms / 1000,
+        jitter_s=latencia_ms / 2000,
+        taxa_429=taxa_429,
+        taxa_erro=taxa_erro,
+        retry_after=1 if taxa_429 else None,
+    )
+    base = falso.iniciar()
+
+    # Precisa estar no ambiente antes de importar o bot (vazio = desligado,
+    # e o load_dotenv() não sobrescreve)
+    os.environ["GRAPH_API_BASE"] = base
+    os.environ.setdefault("WA_ACCESS_TOKEN", "token-carga")
+    os.environ.setdefault("WA_PHONE_NUMBER_ID", "684523561413203")
+    os.environ.setdefault("WA_TAXA_MSGS_S", "1000")
+    os.environ.setdefault("WA_RAJADA", "1000")
+    os.environ.setdefault("CHATBOT_DB_PATH", os.path.join(tempfile.mkdtemp(), "carga.db"))
+    os.environ.setdefault("LOG_NIVEL", "ERROR")
+    for variavel in ("ANTHROPIC_API_KEY", "GROQ_API_KEY", "OFICINA_SHEET_WEBHOOK_URL"):
+        os.environ[variavel] = ""
+
+    import metricas
+    import webhook
+
+    cliente = webhook.app.test_client()
+    numeros = [f"55119{i:08d}" for i in range(conversas)]
+
+    print(f"{conversas} conversas x {len(_RODADAS)} mensagens contra {base}")
+    print(f"Graph falsa: latência {latencia_ms:.0f} ms (+jitter), 429 {taxa_429:.1%}, 5xx {taxa_erro:.1%}")
+
+    latencias = []
+    inicio_total = time.perf_counter()
+
+    for rodada, texto in enumerate(_RODADAS, 1):
+        recebidas = {}
+        inicio = time.perf_counter()
+
+        for numero in numeros:
+            recebidas[numero] = time.time()
+            r = cliente.post(
+                "/webhook",
+                data=_payload(numero, f"wamid.carga.{numero}.{rodada}", texto),
+                content_type="application/json",
+            )
+            assert r.status_code == 200, r.status_code
+
+        ack = time.perf_counter() - inicio
+        respondidas = _aguardar_respostas(falso, numeros, rodada)
+        duracao = time.perf_counter() - inicio
+
+        turno = [respondidas[n] - recebidas[n] for n in numeros]
+        latencias.extend(turno)
+        print(
+            f"rodada {rodada} ({texto!r}): webhook {conversas / ack:7.0f} req/s | "
+            f"turnos {conversas / duracao:6.0f}/s | {_percentis(turno)}"
+        )
+
+    total = time.perf_counter() - inicio_total
+    print(f"total: {conversas * len(_RODADAS) / total:.0f} mensagens/s | {_percentis(latencias)}")
+    print(f"chamadas na Graph falsa: {json.dumps(falso.contagem(), ensure_ascii=False)}")
+
+    contadores = metricas.instantaneo()["contadores"]
+    print(
+        f"retentativas: {contadores.get('wa_retentativas', 0)} | "
+        f"envios economizados (coalescência): {contadores.get('caixa_saida_envios_economizados', 0)}"
+    )
+
+    falso.parar()
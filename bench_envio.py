@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de latência por envio: requests.post() com conexão nova a cada
+mensagem (caminho antigo) contra o WhatsAppClient com pool keep-alive.
+
+Sobe um servidor HTTP local que imita /{versao}/{phone_id}/messages, então
+mede só o custo do cliente (conexão, headers, serialização). Em produção a
+diferença é maior: cada conexão nova para graph.facebook.com paga TCP + TLS.
+
+Uso: python bench_envio.py [envios]
+"""
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from limitador import TokenBucket
+from whatsapp_client import WhatsAppClient, GRAPH_API_VERSION
+
+_RESPOSTA = json.dumps({
+    "messaging_product": "whatsapp",
+    "contacts": [{"input": "5511988780161", "wa_id": "5511988780161"}],
+    "messages": [{"id": "wamid.bench"}],
+}).encode("utf-8")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(_RESPOSTA)))
+        self.end_headers()
+        self.wfile.write(_RESPOSTA)
+
+    def log_message(self, *args):
+        pass
+
+
+def _percentis(amostras):
+    ordenados = sorted(amostras)
+    def p(x):
+        return ordenados[min(len(ordenados) - 1, int(x * len(ordenados)))] * 1000
+    return f"p50 {p(0.50):6.2f} ms | p95 {p(0.95):6.2f} ms | p99 {p(0.99):6.2f} ms"
+
+
+def envio_antigo(url, token, numero):
+    payload = {"messaging_product": "whatsapp", "to": numero, "text": {"body": "Digite seu nome completo:"}}
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json",
+        "Accept": "application/json",
+    }
+    requests.post(url, json=payload, headers=headers)
+
+
+def medir(funcao, envios):
+    amostras = []
+    for _ in range(envios):
+        inicio = time.perf_counter()
+        funcao()
+        amostras.append(time.perf_counter() - inicio)
+    return amostras
+
+
+if __name__ == "__main__":
+    envios = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{servidor.server_address[1]}"
+
+    token = "token-bench"
+    phone_id = "684523561413203"
+    numero = "5511988780161"
+    url = f"{base}/{GRAPH_API_VERSION}/{phone_id}/messages"
+
+    cliente = WhatsAppClient(token=token, phone_number_id=phone_id, base_url=base)
+    # Sem limite de taxa: aqui interessa só o custo por requisição
+    cliente.bucket = TokenBucket("bench", taxa=1e9, capacidade=1e9)
+
+    antigo = medir(lambda: envio_antigo(url, token, numero), envios)
+    novo = medir(lambda: cliente.enviar_texto(numero, "Digite seu nome completo:"), envios)
+
+    print(f"{envios} envios sequenciais contra {base}")
+    print(f"antes  (requests.post):  {_percentis(antigo)} | média {sum(antigo) / envios * 1000:6.2f} ms")
+    print(f"depois (WhatsAppClient): {_percentis(novo)} | média {sum(novo) / envios * 1000:6.2f} ms")
+
+    servidor.shutdown()
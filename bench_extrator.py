@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark: caminho antigo do webhook (json + .get() aninhado + if/elif)
+contra decodificar() + extrair_mensagens() com InboundMessage.
+
+Uso: python bench_extrator.py [repeticoes]
+"""
+import json
+import sys
+import time
+
+from mensagem_entrada import decodificar, extrair_mensagens, orjson
+
+
+def _payload(qtd_mensagens):
+    tipos = [
+        {"type": "text", "text": {"body": "Quero agendar uma revisão"}},
+        {"type": "interactive", "interactive": {"type": "button_reply", "button_reply": {"id": "btn_servicos", "title": "Serviços"}}},
+        {"type": "button", "button": {"text": "Olá"}},
+        {"type": "audio", "audio": {"id": "1234567890", "mime_type": "audio/ogg"}},
+    ]
+    mensagens = []
+    for i in range(qtd_mensagens):
+        m = {"from": "5511988780161", "id": f"wamid.HBgNNTUxMTk4ODc4MDE2MRUCABIYFDNB{i:08d}", "timestamp": "1760000000"}
+        m.update(tipos[i % len(tipos)])
+        mensagens.append(m)
+
+    return json.dumps({
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "123",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "551120922304", "phone_number_id": "684523561413203"},
+                    "contacts": [{"profile": {"name": "Cliente Teste"}, "wa_id": "5511988780161"}],
+                    "messages": mensagens,
+                },
+            }],
+        }],
+    }).encode("utf-8")
+
+
+def caminho_antigo(corpo):
+    data = json.loads(corpo)
+    saida = []
+    for entry in data["entry"]:
+        for change in entry.get("changes", []):
+            value = change.get("value", {})
+            messages = value.get("messages")
+            contacts = value.get("contacts")
+            if not messages or not contacts:
+                continue
+            msg = messages[0]
+            if "from" not in msg:
+                continue
+            numero = contacts[0].get("wa_id")
+            if msg.get("from") != numero:
+                continue
+            nome = contacts[0].get("profile", {}).get("name", "Cliente")
+            texto = ""
+            if msg.get("type") == "text":
+                texto = msg.get("text", {}).get("body", "").strip()
+            elif msg.get("type") == "interactive":
+                interactive = msg.get("interactive", {})
+                tipo = interactive.get("type")
+                if tipo == "button_reply":
+                    texto = interactive["button_reply"].get("id") or interactive["button_reply"].get("title")
+                elif tipo == "list_reply":
+                    texto = interactive["list_reply"].get("id") or interactive["list_reply"].get("title")
+            elif msg.get("type") == "button":
+                texto = msg.get("button", {}).get("text")
+            elif msg.get("type") == "audio":
+                texto = (msg.get("audio") or {}).get("id", "")
+            saida.append((numero, nome, texto, msg.get("type", "desconhecido")))
+    return saida
+
+
+def caminho_novo(corpo):
+    return extrair_mensagens(decodificar(corpo))[0]
+
+
+def medir(funcao, corpo, repeticoes):
+    funcao(corpo)
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao(corpo)
+    return (time.perf_counter() - inicio) / repeticoes * 1e6
+
+
+if __name__ == "__main__":
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"Decodificador: {'orjson' if orjson else 'json (stdlib)'}")
+
+    for qtd in (1, 4, 16):
+        corpo = _payload(qtd)
+        antigo = medir(caminho_antigo, corpo, repeticoes)
+        novo = medir(caminho_novo, corpo, repeticoes)
+        print(
+            f"{qtd:>2} msg/lote ({len(corpo)} bytes): antigo {antigo:7.2f} us | "
+            f"novo {novo:7.2f} us ({novo / qtd:6.2f} us/msg) | {antigo / novo:4.2f}x"
+        )
+    print("Obs.: o caminho antigo só lia messages[0]; o novo extrai todas as mensagens.")
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Latência por append no Google Sheets (gsheets_client), antes e depois do
+service em cache.
+
+"antes": a cada append lê GOOGLE_CREDENTIALS_JSON, monta o service (build)
+e abre um transporte HTTP novo — como o _append fazia.
+"depois": o service da thread é montado uma vez; credenciais, token e
+conexão keep-alive são reaproveitados.
+
+Grava linhas de verdade: use uma aba só para isso (padrão "Bench").
+
+Uso: CLINICA_SHEET_ID=... GOOGLE_CREDENTIALS_JSON=... python bench_gsheets.py [appends] [aba]
+"""
+import json
+import os
+import sys
+import time
+
+from google.oauth2.service_account import Credentials
+from googleapiclient.discovery import build
+
+import gsheets_client
+
+
+def _service_sem_cache():
+    info = json.loads(os.environ["GOOGLE_CREDENTIALS_JSON"])
+    creds = Credentials.from_service_account_info(info, scopes=gsheets_client.SCOPES)
+    return build("sheets", "v4", credentials=creds, cache_discovery=False)
+
+
+def _append(service, aba, linha):
+    return service.spreadsheets().values().append(
+        spreadsheetId=gsheets_client.SHEET_ID, range=f"{aba}!A:Z",
+        valueInputOption="USER_ENTERED",
+        insertDataOption="INSERT_ROWS", body={"values": [linha]},
+    ).execute()
+
+
+def _medir(nome, obter_service, appends, aba):
+    amostras = []
+    for i in range(appends):
+        inicio = time.perf_counter()
+        _append(obter_service(), aba, [time.strftime("%Y-%m-%d %H:%M:%S"), nome, i])
+        amostras.append(time.perf_counter() - inicio)
+
+    # A primeira chamada paga o token e o handshake nos dois casos
+    ordenados = sorted(amostras[1:] or amostras)
+    def p(x):
+        return ordenados[min(len(ordenados) - 1, int(x * len(ordenados)))] * 1000
+    print(
+        f"{nome:7s}: 1ª {amostras[0] * 1000:7.1f} ms | p50 {p(0.50):7.1f} ms | "
+        f"p95 {p(0.95):7.1f} ms | média {sum(ordenados) / len(ordenados) * 1000:7.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    appends = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    aba = sys.argv[2] if len(sys.argv) > 2 else "Bench"
+
+    print(f"{appends} appends por modo na aba {aba!r}")
+    _medir("antes", _service_sem_cache, appends, aba)
+    _medir("depois", gsheets_client._service, appends, aba)
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+import mimetypes
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+import metricas
+import otimizador_imagem
+from log_chatbot import obter_logger
+from sqlite_local import conectar, CHATBOT_DB_PATH
+from whatsapp_client import obter_cliente
+
+log = obter_logger("cache_midia")
+
+# ============================================================
+# CONFIGURAÇÃO
+# ============================================================
+
+# 1 = imagens sobem uma vez para /media e os envios usam o id
+MIDIA_CACHE = os.getenv("MIDIA_CACHE", "1") == "1"
+# A Meta guarda mídia enviada por upload por 30 dias
+MIDIA_TTL_S = int(os.getenv("MIDIA_TTL_S", str(29 * 24 * 3600)))
+
+# Erros da Graph API que indicam media_id inválido/expirado (131052: falha
+# ao baixar a mídia, 131053: mídia inválida). O 100 (parâmetro inválido) é
+# genérico: payload malformado não deve disparar novo upload e reenvio.
+_ERROS_MIDIA = {131052, 131053}
+
+# ============================================================
+# CACHE URL -> MEDIA_ID (MEMÓRIA + SQLITE)
+# ============================================================
+
+class CacheMidia:
+
+    def __init__(self, caminho=CHATBOT_DB_PATH, ttl=MIDIA_TTL_S):
+        self.ttl = ttl
+        self._memoria = {}
+        self._lock = threading.Lock()
+        self._locks_url = {}
+        self._conn = conectar(caminho)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS midias ("
+            " url TEXT PRIMARY KEY,"
+            " media_id TEXT NOT NULL,"
+            " expira_em REAL NOT NULL)"
+        )
+
+    def _lock_da_url(self, url):
+        with self._lock:
+            lock = self._locks_url.get(url)
+            if lock is None:
+                lock = self._locks_url[url] = threading.Lock()
+            return lock
+
+    def _ler(self, url, agora):
+        item = self._memoria.get(url)
+        if item is None:
+            with self._lock:
+                linha = self._conn.execute(
+                    "SELECT media_id, expira_em FROM midias WHERE url = ?", (url,)
+                ).fetchone()
+            if linha:
+                item = self._memoria[url] = linha
+
+        if item and item[1] > agora:
+            return item[0]
+        return None
+
+    def _gravar(self, url, media_id, expira_em):
+        self._memoria[url] = (media_id, expira_em)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO midias (url, media_id, expira_em) VALUES (?, ?, ?)",
+                (url, media_id, expira_em),
+            )
+
+    def invalidar(self, url):
+        self._memoria.pop(url, None)
+        with self._lock:
+            self._conn.execute("DELETE FROM midias WHERE url = ?", (url,))
+
+    def obter(self, url, carregar):
+        """Devolve o media_id da URL; carregar(url) -> media_id só roda uma vez por URL."""
+        media_id = self._ler(url, time.time())
+        if media_id:
+            metricas.incrementar("cache_midia_acertos")
+            return media_id
+
+        # Single-flight: numa campanha vários workers pedem a mesma imagem juntos
+        with self._lock_da_url(url):
+            media_id = self._ler(url, time.time())
+            if media_id:
+                metricas.incrementar("cache_midia_acertos")
+                return media_id
+
+            metricas.incrementar("cache_midia_uploads")
+            media_id = carregar(url)
+            if media_id:
+                self._gravar(url, media_id, time.time() + self.ttl)
+            return media_id
+
+# ============================================================
+# DOWNLOAD + UPLOAD
+# ============================================================
+
+def baixar_imagem(url):
+    # requests puro: o token da Graph API não vai para o Dropbox
+    r = requests.get(url, timeout=30)
+    r.raise_for_status()
+
+    mime = (r.headers.get("Content-Type") or "").split(";")[0].strip()
+    if not mime.startswith("image/"):
+        mime = mimetypes.guess_type(urlparse(url).path)[0] or "image/jpeg"
+
+    return r.content, mime
+
+
+def subir_imagem(url):
+    try:
+        conteudo, mime_original = baixar_imagem(url)
+        # Redimensiona/recodifica uma vez por conteúdo; o upload já vai leve
+        conteudo, mime = otimizador_imagem.otimizar(conteudo, mime_original, url)
+
+        nome = os.path.basename(urlparse(url).path) or "imagem"
+        if mime != mime_original:
+            nome = f"{os.path.splitext(nome)[0]}.jpg"
+        media_id = obter_cliente().enviar_midia(conteudo, mime, nome)
+        if media_id:
+            log.info("🖼️ Imagem enviada para /media", extra={"dados": {"url": url, "media_id": media_id}})
+        return media_id
+    except Exception as e:
+        log.warning("⚠️ Erro ao subir imagem %s: %s", url, e)
+        return ""
+
+# ============================================================
+# API
+# ============================================================
+
+_CACHE = None
+_LOCK = threading.Lock()
+
+
+def _cache():
+    global _CACHE
+    if _CACHE is None:
+        with _LOCK:
+            if _CACHE is None:
+                _CACHE = CacheMidia()
+    return _CACHE
+
+
+def parametro_imagem(url):
+    """{"id": media_id} se o upload deu certo; senão {"link": url} (comportamento antigo)."""
+    if not MIDIA_CACHE or not url:
+        return {"link": url}
+
+    media_id = _cache().obter(url, subir_imagem)
+    if media_id:
+        return {"id": media_id}
+
+    metricas.incrementar("cache_midia_fallback_link")
+    return {"link": url}
+
+
+def _midia_invalida(resposta):
+    if resposta is None or resposta.status_code < 400:
+        return False
+    try:
+        return resposta.json().get("error", {}).get("code") in _ERROS_MIDIA
+    except Exception:
+        return False
+
+
+def enviar_com_imagem(url, enviar):
+    """enviar(parametro_imagem) -> Response. Se o id expirou, sobe de novo e reenvia."""
+    parametro = parametro_imagem(url)
+    r = enviar(parametro)
+
+    if "id" in parametro and _midia_invalida(r):
+        metricas.incrementar("cache_midia_reuploads")
+        _cache().invalidar(url)
+        parametro = parametro_imagem(url)
+        r = enviar(parametro)
+
+    return r
+
+
+def invalidar(url):
+    _cache().invalidar(url)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import metricas
+from log_chatbot import obter_logger
+
+log = obter_logger("cache")
+
+# ============================================================
+# CACHE DE UM VALOR COM TTL + STALE-WHILE-REVALIDATE
+# ============================================================
+# - fresco: devolve direto
+# - vencido: devolve o valor antigo na hora e atualiza em background
+# - vazio (nunca carregou ou foi invalidado): uma carga só; quem chegar
+#   enquanto ela roda espera por ela em vez de chamar o carregador de novo
+# Resultado vazio/erro do carregador não apaga o último valor bom.
+# invalidar() descarta o valor na hora: o antigo não é mais servido.
+
+class CacheTTL:
+
+    def __init__(self, nome, carregar, ttl, ttl_erro=60, espera_s=30):
+        self.nome = nome
+        self.carregar = carregar
+        self.ttl = ttl
+        self.ttl_erro = ttl_erro
+        self.espera_s = espera_s
+        self._valor = None
+        self._expira_em = 0.0
+        self._lock = threading.Lock()
+        # (Event, geração) da carga em andamento; a geração muda a cada
+        # invalidar() e o resultado de uma carga anterior é descartado
+        self._carga = None
+        self._geracao = 0
+
+    def _iniciar_carga(self):
+        """Devolve (carga, dono); só o dono chama o carregador."""
+        with self._lock:
+            if self._carga is not None:
+                return self._carga, False
+            self._carga = (threading.Event(), self._geracao)
+            return self._carga, True
+
+    def _recarregar(self, carga):
+        evento, geracao = carga
+        inicio = time.monotonic()
+        try:
+            valor = self.carregar()
+        except Exception as e:
+            log.warning("⚠️ Erro ao recarregar cache %s: %s", self.nome, e)
+            valor = None
+        metricas.observar(f"cache_{self.nome}_carga_ms", (time.monotonic() - inicio) * 1000)
+
+        with self._lock:
+            if geracao != self._geracao:
+                # Invalidado durante a carga: o valor lido pode ser o antigo
+                metricas.incrementar(f"cache_{self.nome}_cargas_descartadas")
+            elif valor:
+                self._valor = valor
+                self._expira_em = time.time() + self.ttl
+            else:
+                # Mantém o valor antigo e tenta de novo daqui a pouco
+                self._expira_em = time.time() + self.ttl_erro
+                metricas.incrementar(f"cache_{self.nome}_falhas_carga")
+
+            if self._carga is carga:
+                self._carga = None
+
+        evento.set()
+        return self._valor
+
+    def _atualizar_em_background(self):
+        carga, dono = self._iniciar_carga()
+        if dono:
+            threading.Thread(target=self._recarregar, args=(carga,), name=f"cache-{self.nome}", daemon=True).start()
+
+    def obter(self):
+        agora = time.time()
+        valor = self._valor
+
+        if valor is not None and agora < self._expira_em:
+            metricas.incrementar(f"cache_{self.nome}_acertos")
+            return valor
+
+        if valor is not None:
+            metricas.incrementar(f"cache_{self.nome}_vencidos")
+            self._atualizar_em_background()
+            return valor
+
+        metricas.incrementar(f"cache_{self.nome}_faltas")
+        carga, dono = self._iniciar_carga()
+        if dono:
+            return self._recarregar(carga) or ""
+
+        metricas.incrementar(f"cache_{self.nome}_esperas")
+        carga[0].wait(self.espera_s)
+        return self._valor or ""
+
+    def valor_atual(self):
+        return self._valor
+
+    def aquecer(self):
+        """Carrega em background (ex.: na subida do app) para o 1º envio não esperar."""
+        self._atualizar_em_background()
+
+    def invalidar(self, recarregar=True):
+        with self._lock:
+            self._valor = None
+            self._expira_em = 0.0
+            self._geracao += 1
+            # Carga em andamento é da versão antiga: quem chegar agora espera a nova
+            self._carga = None
+        if recarregar:
+            self._atualizar_em_background()
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import cache_midia
+import catalogo_mensagens
+import fila_envio
+import metricas
+from dedup import DedupMensagens, DEDUP_SQLITE_PATH
+from log_chatbot import obter_logger
+from sqlite_local import CHATBOT_DB_PATH
+from whatsapp_client import obter_cliente
+
+log = obter_logger("caixa_saida")
+
+# 1 = marca como lida e mostra "digitando..." quando o turno entra num caminho lento
+SINAL_DIGITANDO = os.getenv("SINAL_DIGITANDO", "1") == "1"
+
+# ============================================================
+# LIMITES DA WHATSAPP CLOUD API
+# ============================================================
+
+LIMITE_TEXTO = 4096
+LIMITE_CORPO_BOTOES = 1024
+
+# ============================================================
+# CAIXA DE SAÍDA POR TURNO
+# ============================================================
+# Tudo que um responder_oficina() envia fica guardado aqui e sai de uma
+# vez no fim do turno, já coalescido:
+#   texto + texto (mesmo número)  -> um texto só
+#   texto + botões (mesmo número) -> um interativo com o texto no corpo
+# Texto do catálogo que não foi juntado com nada sai com os bytes prontos.
+
+_LOCAL = threading.local()
+
+
+class Turno:
+    __slots__ = ("itens", "mensagem_id")
+
+    def __init__(self, mensagem_id=None):
+        self.itens = []
+        # id da mensagem recebida que originou o turno (chave de idempotência)
+        self.mensagem_id = mensagem_id
+
+
+def turno_ativo():
+    return getattr(_LOCAL, "turno", None)
+
+
+def adicionar(tipo, numero, **dados):
+    """Guarda o envio no turno atual. Retorna False se não há turno aberto."""
+    turno = turno_ativo()
+    if turno is None:
+        return False
+
+    dados["tipo"] = tipo
+    dados["numero"] = numero
+    turno.itens.append(dados)
+    return True
+
+
+@contextmanager
+def turno(mensagem_id=None):
+    # Turno aninhado (ex.: responder_oficina chamando a si mesmo) usa o de fora
+    atual = turno_ativo()
+    if atual is not None:
+        yield atual
+        return
+
+    novo = Turno(mensagem_id)
+    _LOCAL.turno = novo
+    try:
+        yield novo
+    finally:
+        _LOCAL.turno = None
+        descarregar(novo.itens, mensagem_id)
+
+# ============================================================
+# COALESCÊNCIA
+# ============================================================
+
+def _juntar(anterior, atual):
+    if anterior["numero"] != atual["numero"] or anterior["tipo"] != "texto":
+        return None
+
+    if atual["tipo"] == "texto":
+        texto = f"{anterior['texto']}\n\n{atual['texto']}"
+        if len(texto) <= LIMITE_TEXTO:
+            return {"tipo": "texto", "numero": atual["numero"], "texto": texto}
+
+    if atual["tipo"] == "botoes":
+        texto = f"{anterior['texto']}\n\n{atual['texto']}"
+        if len(texto) <= LIMITE_CORPO_BOTOES:
+            return {"tipo": "botoes", "numero": atual["numero"], "texto": texto, "botoes": atual["botoes"]}
+
+    return None
+
+
+def coalescer(itens):
+    saida = []
+    for item in itens:
+        if saida:
+            junto = _juntar(saida[-1], item)
+            if junto is not None:
+                saida[-1] = junto
+                continue
+        saida.append(item)
+    return saida
+
+# ============================================================
+# IDEMPOTÊNCIA (MENSAGEM RECEBIDA, PASSO)
+# ============================================================
+# Webhook reentregue já é barrado na entrada (MENSAGENS_PROCESSADAS no
+# webhook). Se o turno rodar de novo mesmo assim (ex.: o processo caiu no
+# meio dele), cada envio "<id recebido>:<passo>" que já saiu não sai de
+# novo. A marca só é gravada depois que o envio foi aceito (ou
+# enfileirado), então envio que falhou pode sair de novo. Gravado em
+# SQLite para valer entre restarts.
+
+_ENVIOS_FEITOS = None
+_LOCK_ENVIOS = threading.Lock()
+
+
+def _idempotencia():
+    global _ENVIOS_FEITOS
+
+    if _ENVIOS_FEITOS is None:
+        with _LOCK_ENVIOS:
+            if _ENVIOS_FEITOS is None:
+                _ENVIOS_FEITOS = DedupMensagens(
+                    nome="idempotencia_envios", caminho_sqlite=DEDUP_SQLITE_PATH or CHATBOT_DB_PATH
+                )
+    return _ENVIOS_FEITOS
+
+
+def ja_enviado(mensagem_id, passo):
+    """True se o envio (mensagem_id, passo) já foi feito. Não marca."""
+    if not mensagem_id:
+        return False
+    return _idempotencia().contem(f"{mensagem_id}:{passo}")
+
+
+def marcar_enviado(mensagem_id, passo):
+    if mensagem_id:
+        _idempotencia().registrar(f"{mensagem_id}:{passo}")
+
+# ============================================================
+# LIDO + DIGITANDO (EM PARALELO COM O TRABALHO LENTO)
+# ============================================================
+# Antes de chamar o Claude ou transcrever um áudio, o turno dispara o
+# "lida + digitando..." numa thread à parte e segue: o cliente vê a reação
+# depois de uma ida e volta à Graph, sem somar tempo ao turno.
+
+_SINAIS = ThreadPoolExecutor(max_workers=4, thread_name_prefix="sinal-digitando")
+# Um sinal por mensagem recebida (áudio transcrito que depois vai para a IA)
+_SINALIZADAS = DedupMensagens(nome="sinais_digitando", ttl=120, capacidade=10000)
+
+
+def _enviar_sinal(mensagem_id):
+    try:
+        r = obter_cliente().marcar_lido(mensagem_id)
+        metricas.incrementar(f"sinais_digitando_{r.status_code // 100}xx")
+    except Exception as e:
+        log.debug("Sinal de digitando não enviado: %s", e)
+
+
+def sinalizar_digitando(mensagem_id=None):
+    """Marca a mensagem recebida como lida e mostra "digitando...", sem esperar."""
+    if not SINAL_DIGITANDO:
+        return
+
+    if mensagem_id is None:
+        atual = turno_ativo()
+        mensagem_id = atual.mensagem_id if atual is not None else None
+
+    if not mensagem_id or not _SINALIZADAS.registrar(mensagem_id):
+        return
+
+    _SINAIS.submit(_enviar_sinal, mensagem_id)
+
+# ============================================================
+# ENVIO
+# ============================================================
+
+def enviar_item(item):
+    cliente = obter_cliente()
+    tipo = item["tipo"]
+
+    if tipo == "texto" and item.get("catalogo"):
+        corpo = catalogo_mensagens.preencher(item["catalogo"], item["numero"], **item.get("campos", {}))
+        return cliente.enviar_bruto(corpo)
+    if tipo == "texto":
+        return cliente.enviar_texto(item["numero"], item["texto"])
+    if tipo == "botoes":
+        return cliente.enviar_botoes(item["numero"], item["texto"], item["botoes"])
+    if tipo == "imagem":
+        return cache_midia.enviar_com_imagem(
+            item["link"],
+            lambda imagem: cliente.enviar_imagem(item["numero"], imagem.get("link"), imagem.get("id")),
+        )
+
+    raise ValueError(f"Tipo de envio desconhecido: {tipo}")
+
+
+def descarregar(itens, mensagem_id=None):
+    if not itens:
+        return
+
+    enviados = coalescer(itens)
+    economizados = len(itens) - len(enviados)
+
+    metricas.incrementar("caixa_saida_turnos")
+    if economizados:
+        metricas.incrementar("caixa_saida_envios_economizados", economizados)
+
+    for passo, item in enumerate(enviados):
+        if ja_enviado(mensagem_id, passo):
+            log.info(
+                "♻️ Envio repetido ignorado",
+                extra={"dados": {"numero": item["numero"], "mensagem_id": mensagem_id, "passo": passo}},
+            )
+            continue
+
+        metricas.incrementar("caixa_saida_envios")
+        try:
+            if fila_envio.ENVIO_ASSINCRONO:
+                # Sai em background, em ordem por destinatário, com rastreio do wamid
+                fila_envio.enviar(item)
+            else:
+                r = enviar_item(item)
+                if r is not None and r.status_code >= 400:
+                    continue
+        except Exception as e:
+            log.error("❌ Erro ao enviar %s: %s", item["tipo"], e, extra={"dados": {"numero": item["numero"]}})
+            continue
+
+        marcar_enviado(mensagem_id, passo)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+import json
+import re
+import threading
+import time
+
+import metricas
+
+# ============================================================
+# CATÁLOGO DE MENSAGENS FIXAS (PRÉ-SERIALIZADAS)
+# ============================================================
+# Menu, endereço, fechamentos e avisos de opção inválida nunca mudam.
+# O payload de cada um é montado e serializado em JSON uma única vez no
+# registro; no envio só os campos variáveis (destinatário, nome) são
+# encaixados nos bytes prontos, sem montar dict nem chamar json.dumps.
+
+_RE_CAMPO_JSON = re.compile(rb"\\u0000(\w+)\\u0000")
+_RE_CAMPO_TEXTO = re.compile("\x00(\\w+)\x00")
+
+
+def campo(nome):
+    """Marcador de campo variável para usar dentro do texto registrado."""
+    return f"\x00{nome}\x00"
+
+
+def _escapar(valor):
+    # Mesmo escape que o json.dumps faria com o valor dentro de uma string
+    texto = str(valor)
+    if texto.isalnum():
+        # Número de telefone e afins: nada a escapar
+        return texto.encode("utf-8")
+    return json.dumps(texto, ensure_ascii=False)[1:-1].encode("utf-8")
+
+
+def _payload_texto(numero, texto):
+    return {
+        "messaging_product": "whatsapp",
+        "to": numero,
+        "type": "text",
+        "text": {"body": texto},
+    }
+
+
+class MensagemCompilada:
+    __slots__ = ("chave", "modelo", "partes", "nomes", "tamanho", "compilar_us")
+
+    def __init__(self, chave, texto):
+        inicio = time.perf_counter()
+
+        self.chave = chave
+        self.modelo = texto
+
+        # O \x00 vira "\u0000" no JSON: é por ele que os bytes são fatiados
+        corpo = json.dumps(
+            _payload_texto(campo("to"), texto), ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+        pedacos = _RE_CAMPO_JSON.split(corpo)
+
+        self.partes = tuple(pedacos[0::2])
+        self.nomes = tuple(p.decode("ascii") for p in pedacos[1::2])
+        self.tamanho = len(corpo)
+        self.compilar_us = (time.perf_counter() - inicio) * 1e6
+
+    def preencher(self, **campos):
+        partes = self.partes
+        saida = [partes[0]]
+        for i, nome in enumerate(self.nomes, 1):
+            saida.append(_escapar(campos[nome]))
+            saida.append(partes[i])
+        return b"".join(saida)
+
+    def texto(self, **campos):
+        # Texto final (usado quando a caixa de saída junta com outra mensagem)
+        if "\x00" not in self.modelo:
+            return self.modelo
+        return _RE_CAMPO_TEXTO.sub(lambda m: str(campos[m.group(1)]), self.modelo)
+
+# ============================================================
+# REGISTRO
+# ============================================================
+
+_CATALOGO = {}
+_CUSTOS = {}
+_LOCK = threading.Lock()
+
+
+def registrar(chave, texto):
+    mensagem = MensagemCompilada(chave, texto)
+    with _LOCK:
+        _CATALOGO[chave] = mensagem
+        _CUSTOS.pop(chave, None)
+    return mensagem
+
+
+def obter(chave):
+    return _CATALOGO[chave]
+
+
+def preencher(chave, numero, **campos):
+    metricas.incrementar("catalogo_envios")
+    return _CATALOGO[chave].preencher(to=numero, **campos)
+
+# ============================================================
+# CUSTO DE CODIFICAÇÃO POR MENSAGEM
+# ============================================================
+
+_AMOSTRA_NUMERO = "5511999999999"
+_AMOSTRA_NOME = "Cliente Exemplo"
+_REPETICOES = 200
+
+
+def _medir(funcao):
+    inicio = time.perf_counter()
+    for _ in range(_REPETICOES):
+        funcao()
+    return round((time.perf_counter() - inicio) * 1e6 / _REPETICOES, 2)
+
+
+def _custo(mensagem):
+    campos = {nome: _AMOSTRA_NOME for nome in mensagem.nomes if nome != "to"}
+    texto = mensagem.texto(**campos)
+
+    # json_us: o que o requests faz com json=payload a cada envio
+    json_us = _medir(lambda: json.dumps(_payload_texto(_AMOSTRA_NUMERO, texto)).encode("utf-8"))
+    preencher_us = _medir(lambda: mensagem.preencher(to=_AMOSTRA_NUMERO, **campos))
+
+    return {
+        "bytes": mensagem.tamanho,
+        "compilar_us": round(mensagem.compilar_us, 2),
+        "json_us": json_us,
+        "preencher_us": preencher_us,
+    }
+
+
+def custos():
+    """Custo por envio de cada mensagem: json.dumps do dict x bytes prontos."""
+    with _LOCK:
+        pendentes = [m for chave, m in _CATALOGO.items() if chave not in _CUSTOS]
+
+    for mensagem in pendentes:
+        custo = _custo(mensagem)
+        with _LOCK:
+            _CUSTOS[mensagem.chave] = custo
+
+    with _LOCK:
+        return dict(sorted(_CUSTOS.items()))
+
+
+# Medido uma vez por mensagem, na primeira leitura de /metricas
+metricas.registrar_gauge("catalogo_custos", custos)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metricas
+from sqlite_local import conectar
+from log_chatbot import obter_logger
+
+log = obter_logger("dedup")
+
+# ============================================================
+# CONFIGURAÇÃO
+# ============================================================
+
+# A Meta reenvia webhooks não confirmados por até 7 dias
+DEDUP_TTL_S = int(os.getenv("DEDUP_TTL_S", str(7 * 24 * 3600)))
+DEDUP_MAX = int(os.getenv("DEDUP_MAX", "100000"))
+# Se definido, o dedup é compartilhado entre workers e sobrevive a restart
+DEDUP_SQLITE_PATH = os.getenv("DEDUP_SQLITE_PATH", "")
+
+_LIMPEZA_A_CADA = 500
+
+# ============================================================
+# DEDUP DE IDS COM JANELA DE TEMPO E LIMITE DE MEMÓRIA
+# ============================================================
+
+def _chave(valor):
+    # Hash de largura fixa (int64): o wamid tem ~60 chars, a chave ocupa 8 bytes
+    digest = hashlib.blake2b(str(valor).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+class DedupMensagens:
+
+    def __init__(self, nome="dedup", ttl=DEDUP_TTL_S, capacidade=DEDUP_MAX, caminho_sqlite=None):
+        self.nome = nome
+        self.ttl = ttl
+        self.capacidade = capacidade
+        # chave -> expira_em. Como o TTL é fixo, a ordem de inserção já é a
+        # ordem de expiração: os mais antigos saem pela frente (ring buffer).
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._insercoes = 0
+
+        if caminho_sqlite:
+            self._conn = conectar(caminho_sqlite)
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {nome} (chave INTEGER PRIMARY KEY, expira REAL NOT NULL)"
+            )
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {nome}_expira ON {nome} (expira)")
+
+        metricas.registrar_gauge(f"{nome}_memoria", lambda: len(self._memoria))
+
+    def _expirar_memoria(self, agora):
+        while self._memoria:
+            chave, expira = next(iter(self._memoria.items()))
+            if expira > agora and len(self._memoria) <= self.capacidade:
+                break
+            self._memoria.popitem(last=False)
+
+    def _registrar_sqlite(self, chave, agora):
+        # Insere; se já existir mas estiver expirado, renova. rowcount == 0
+        # significa que outro worker/processo já viu este id dentro da janela.
+        cur = self._conn.execute(
+            f"INSERT INTO {self.nome} (chave, expira) VALUES (?, ?) "
+            f"ON CONFLICT(chave) DO UPDATE SET expira = excluded.expira "
+            f"WHERE {self.nome}.expira <= ?",
+            (chave, agora + self.ttl, agora),
+        )
+        nova = cur.rowcount == 1
+
+        self._insercoes += 1
+        if self._insercoes % _LIMPEZA_A_CADA == 0:
+            self._conn.execute(f"DELETE FROM {self.nome} WHERE expira <= ?", (agora,))
+            self._conn.execute(
+                f"DELETE FROM {self.nome} WHERE chave IN ("
+                f"SELECT chave FROM {self.nome} ORDER BY expira DESC LIMIT -1 OFFSET ?)",
+                (self.capacidade,),
+            )
+
+        return nova
+
+    def registrar(self, valor):
+        """Retorna True se o id é novo (e o marca como visto), False se é repetido."""
+        if not valor:
+            return True
+
+        chave = _chave(valor)
+        agora = time.time()
+
+        with self._lock:
+            self._expirar_memoria(agora)
+
+            if chave in self._memoria:
+                metricas.incrementar(f"{self.nome}_repetidas")
+                return False
+
+            if self._conn is not None:
+                try:
+                    nova = self._registrar_sqlite(chave, agora)
+                except Exception as e:
+                    # Banco indisponível: segue só com a memória local
+                    log.warning("⚠️ Erro no dedup SQLite (%s): %s", self.nome, e)
+                    nova = True
+
+                if not nova:
+                    self._memoria[chave] = agora + self.ttl
+                    metricas.incrementar(f"{self.nome}_repetidas")
+                    return False
+
+            self._memoria[chave] = agora + self.ttl
+            if len(self._memoria) > self.capacidade:
+                self._memoria.popitem(last=False)
+
+            metricas.incrementar(f"{self.nome}_novas")
+            return True
+
+    def contem(self, valor):
+        """True se o id já foi registrado e ainda está na janela (não marca)."""
+        if not valor:
+            return False
+
+        chave = _chave(valor)
+        agora = time.time()
+
+        with self._lock:
+            expira = self._memoria.get(chave)
+            if expira is not None and expira > agora:
+                return True
+
+            if self._conn is None:
+                return False
+
+            try:
+                linha = self._conn.execute(
+                    f"SELECT 1 FROM {self.nome} WHERE chave = ? AND expira > ?", (chave, agora)
+                ).fetchone()
+            except Exception as e:
+                log.warning("⚠️ Erro no dedup SQLite (%s): %s", self.nome, e)
+                return False
+
+            return linha is not None
+
+    def __len__(self):
+        return len(self._memoria)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+import time
+
+import metricas
+from log_chatbot import obter_logger
+
+log = obter_logger("disjuntor")
+
+# ============================================================
+# CONFIGURAÇÃO
+# ============================================================
+
+# Padrões; cada dependência pode sobrescrever com
+# DISJUNTOR_<NOME>_FALHAS / DISJUNTOR_<NOME>_ABERTO_S (ex.: DISJUNTOR_VIACEP_FALHAS=3)
+DISJUNTOR_FALHAS = int(os.getenv("DISJUNTOR_FALHAS", "5"))
+DISJUNTOR_ABERTO_S = float(os.getenv("DISJUNTOR_ABERTO_S", "30"))
+
+FECHADO = "fechado"
+ABERTO = "aberto"
+MEIO_ABERTO = "meio_aberto"
+
+# ============================================================
+# DISJUNTOR (CIRCUIT BREAKER)
+# ============================================================
+# fechado     -> chamadas passam; N falhas seguidas abrem o disjuntor
+# aberto      -> chamadas falham na hora (fallback) por ABERTO_S segundos
+# meio_aberto -> uma chamada de teste passa; sucesso fecha, falha reabre
+
+
+class CircuitoAberto(Exception):
+    pass
+
+
+class Disjuntor:
+
+    def __init__(self, nome, falhas_max=DISJUNTOR_FALHAS, aberto_s=DISJUNTOR_ABERTO_S):
+        self.nome = nome
+        self.falhas_max = falhas_max
+        self.aberto_s = aberto_s
+
+        self._lock = threading.Lock()
+        self._estado = FECHADO
+        self._falhas = 0
+        self._aberto_em = 0.0
+        self._testando = False
+
+    def permitir(self):
+        with self._lock:
+            if self._estado == FECHADO:
+                return True
+
+            if self._estado == ABERTO:
+                if time.monotonic() - self._aberto_em < self.aberto_s:
+                    metricas.incrementar(f"disjuntor_{self.nome}_rejeitadas")
+                    return False
+                self._estado = MEIO_ABERTO
+                self._testando = False
+                log.info("🟡 Disjuntor %s meio-aberto: testando dependência", self.nome)
+
+            # Meio-aberto: só uma chamada de teste por vez
+            if self._testando:
+                metricas.incrementar(f"disjuntor_{self.nome}_rejeitadas")
+                return False
+            self._testando = True
+            return True
+
+    def sucesso(self):
+        with self._lock:
+            if self._estado != FECHADO:
+                log.info("🟢 Disjuntor %s fechado: dependência respondeu", self.nome)
+            self._estado = FECHADO
+            self._falhas = 0
+            self._testando = False
+
+    def falha(self):
+        with self._lock:
+            self._falhas += 1
+            metricas.incrementar(f"disjuntor_{self.nome}_falhas")
+
+            if self._estado == MEIO_ABERTO or self._falhas >= self.falhas_max:
+                if self._estado != ABERTO:
+                    log.warning(
+                        "🔴 Disjuntor %s aberto após %s falhas (por %.0fs)",
+                        self.nome, self._falhas, self.aberto_s,
+                    )
+                    metricas.incrementar(f"disjuntor_{self.nome}_aberturas")
+                self._estado = ABERTO
+                self._aberto_em = time.monotonic()
+                self._testando = False
+
+    def chamar(self, funcao, *args, falhou=None, **kwargs):
+        """Executa funcao pelo disjuntor; levanta CircuitoAberto se estiver aberto.
+
+        `falhou(resultado)` decide se um retorno sem exceção (ex.: resposta
+        5xx) também conta como falha da dependência.
+        """
+        if not self.permitir():
+            raise CircuitoAberto(self.nome)
+
+        try:
+            resultado = funcao(*args, **kwargs)
+        except Exception:
+            self.falha()
+            raise
+
+        if falhou is not None and falhou(resultado):
+            self.falha()
+        else:
+            self.sucesso()
+        return resultado
+
+    def estado(self):
+        with self._lock:
+            estado = self._estado
+            restante = 0.0
+            if estado == ABERTO:
+                restante = max(0.0, self.aberto_s - (time.monotonic() - self._aberto_em))
+            return {
+                "estado": estado,
+                "falhas_seguidas": self._falhas,
+                "falhas_max": self.falhas_max,
+                "aberto_s": self.aberto_s,
+                "reabre_em_s": round(restante, 1),
+            }
+
+# ============================================================
+# DISJUNTORES POR DEPENDÊNCIA
+# ============================================================
+
+_DISJUNTORES = {}
+_LOCK = threading.Lock()
+
+
+def obter_disjuntor(nome):
+    disjuntor = _DISJUNTORES.get(nome)
+    if disjuntor is None:
+        with _LOCK:
+            disjuntor = _DISJUNTORES.get(nome)
+            if disjuntor is None:
+                prefixo = f"DISJUNTOR_{nome.upper()}"
+                disjuntor = Disjuntor(
+                    nome,
+                    falhas_max=int(os.getenv(f"{prefixo}_FALHAS", str(DISJUNTOR_FALHAS))),
+                    aberto_s=float(os.getenv(f"{prefixo}_ABERTO_S", str(DISJUNTOR_ABERTO_S))),
+                )
+                _DISJUNTORES[nome] = disjuntor
+    return disjuntor
+
+
+def estados():
+    with _LOCK:
+        disjuntores = list(_DISJUNTORES.values())
+    return {d.nome: d.estado() for d in disjuntores}
+
+
+metricas.registrar_gauge("disjuntores", lambda: {n: e["estado"] for n, e in estados().items()})
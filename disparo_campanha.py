@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import cache_midia
+import otimizador_imagem
+import metricas
+from log_chatbot import obter_logger
+from sqlite_local import conectar, CHATBOT_DB_PATH
+from whatsapp_client import obter_cliente
+
+log = obter_logger("campanha")
+
+# ============================================================
+# CONFIGURAÇÃO
+# ============================================================
+
+CAMPANHA_TEMPLATE = os.getenv("CAMPANHA_TEMPLATE", "oficina_disparo2")
+# Envios simultâneos por campanha; o teto real de msgs/s é o token bucket do número
+CAMPANHA_CONCORRENCIA = int(os.getenv("CAMPANHA_CONCORRENCIA", "8"))
+ARQUIVO_MALA_DIRETA = os.getenv("ARQUIVO_MALA_DIRETA", "mala_direta.csv")
+
+# Campanha "executando" sem batimento há mais que isso = processo caiu.
+# O batimento sai de uma thread própria, a cada _BATIMENTO_S / 4, para não
+# depender de envio concluído (token bucket ou Retry-After podem segurar
+# todos os envios por mais de um minuto).
+_BATIMENTO_S = 60
+
+# ============================================================
+# LISTA DE DESTINATÁRIOS
+# ============================================================
+
+def _limpar_numero(valor):
+    return "".join(c for c in str(valor) if c.isdigit())
+
+
+def ler_numeros(texto):
+    """Lê números de um CSV/TXT (primeira coluna), ignorando cabeçalho e repetidos."""
+    numeros = []
+    vistos = set()
+
+    for linha in csv.reader(io.StringIO(texto)):
+        if not linha:
+            continue
+        numero = _limpar_numero(linha[0])
+        if len(numero) < 10 or numero in vistos:
+            continue
+        vistos.add(numero)
+        numeros.append(numero)
+
+    return numeros
+
+
+def carregar_mala_direta(caminho=ARQUIVO_MALA_DIRETA):
+    with open(caminho, "r", encoding="utf-8") as arquivo:
+        return ler_numeros(arquivo.read())
+
+# ============================================================
+# ENVIO DO TEMPLATE
+# ============================================================
+
+def enviar_template_campanha(numero, imagem_url="", template=CAMPANHA_TEMPLATE):
+    if not imagem_url:
+        return obter_cliente().enviar_template(numero, template)
+
+    def enviar(imagem):
+        componentes = [
+            {
+                "type": "header",
+                "parameters": [
+                    {
+                        "type": "image",
+                        "image": imagem
+                    }
+                ]
+            }
+        ]
+        return obter_cliente().enviar_template(numero, template, componentes=componentes)
+
+    # A imagem sobe uma vez para /media; os destinatários recebem pelo id
+    return cache_midia.enviar_com_imagem(imagem_url, enviar)
+
+# ============================================================
+# CHECKPOINT EM SQLITE
+# ============================================================
+
+class RegistroCampanhas:
+
+    def __init__(self, caminho=CHATBOT_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = conectar(caminho)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS campanhas ("
+            " id TEXT PRIMARY KEY,"
+            " template TEXT NOT NULL,"
+            " imagem_url TEXT,"
+            " status TEXT NOT NULL,"
+            " criado_em REAL NOT NULL,"
+            " iniciado_em REAL,"
+            " concluido_em REAL,"
+            " batimento_em REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS campanha_destinatarios ("
+            " campanha_id TEXT NOT NULL,"
+            " numero TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " wamid TEXT,"
+            " erro TEXT,"
+            " atualizado_em REAL,"
+            " PRIMARY KEY (campanha_id, numero))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS campanha_destinatarios_status "
+            "ON campanha_destinatarios (campanha_id, status)"
+        )
+
+    def criar(self, numeros, imagem_url, template):
+        campanha_id = uuid.uuid4().hex[:12]
+        agora = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT INTO campanhas (id, template, imagem_url, status, criado_em) "
+                "VALUES (?, ?, ?, 'pendente', ?)",
+                (campanha_id, template, imagem_url, agora),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO campanha_destinatarios (campanha_id, numero, status, atualizado_em) "
+                "VALUES (?, ?, 'pendente', ?)",
+                [(campanha_id, n, agora) for n in numeros],
+            )
+            self._conn.execute("COMMIT")
+        return campanha_id
+
+    def assumir(self, campanha_id):
+        # Só um processo executa cada campanha; retoma as que ficaram órfãs
+        agora = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE campanhas SET status = 'executando', batimento_em = ?, "
+                "iniciado_em = COALESCE(iniciado_em, ?) "
+                "WHERE id = ? AND (status = 'pendente' OR (status = 'executando' AND batimento_em < ?))",
+                (agora, agora, campanha_id, agora - _BATIMENTO_S),
+            )
+            return cur.rowcount == 1
+
+    def dados(self, campanha_id):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT template, imagem_url FROM campanhas WHERE id = ?", (campanha_id,)
+            ).fetchone()
+
+    def orfas(self):
+        with self._lock:
+            return [
+                linha[0] for linha in self._conn.execute(
+                    "SELECT id FROM campanhas WHERE status = 'pendente' "
+                    "OR (status = 'executando' AND batimento_em < ?)",
+                    (time.time() - _BATIMENTO_S,),
+                ).fetchall()
+            ]
+
+    def pendentes(self, campanha_id, limite=500):
+        with self._lock:
+            return [
+                linha[0] for linha in self._conn.execute(
+                    "SELECT numero FROM campanha_destinatarios "
+                    "WHERE campanha_id = ? AND status = 'pendente' LIMIT ?",
+                    (campanha_id, limite),
+                ).fetchall()
+            ]
+
+    def reservar(self, campanha_id, numero):
+        # 'enviando' gravado ANTES do envio: se o processo cair no meio, esse
+        # número fica como incerto e não é reenviado na retomada.
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE campanha_destinatarios SET status = 'enviando', atualizado_em = ? "
+                "WHERE campanha_id = ? AND numero = ? AND status = 'pendente'",
+                (time.time(), campanha_id, numero),
+            )
+            return cur.rowcount == 1
+
+    def concluir_envio(self, campanha_id, numero, status, wamid=None, erro=None):
+        agora = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE campanha_destinatarios SET status = ?, wamid = ?, erro = ?, atualizado_em = ? "
+                "WHERE campanha_id = ? AND numero = ?",
+                (status, wamid, erro, agora, campanha_id, numero),
+            )
+
+    def bater(self, campanha_id):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE campanhas SET batimento_em = ? WHERE id = ? AND status = 'executando'",
+                (time.time(), campanha_id),
+            )
+
+    def finalizar(self, campanha_id):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE campanhas SET status = 'concluida', concluido_em = ? WHERE id = ?",
+                (time.time(), campanha_id),
+            )
+
+    def resumo(self, campanha_id):
+        with self._lock:
+            campanha = self._conn.execute(
+                "SELECT template, imagem_url, status, criado_em, iniciado_em, concluido_em "
+                "FROM campanhas WHERE id = ?",
+                (campanha_id,),
+            ).fetchone()
+            if campanha is None:
+                return None
+
+            contagem = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM campanha_destinatarios WHERE campanha_id = ? GROUP BY status",
+                (campanha_id,),
+            ).fetchall())
+            ultimo = self._conn.execute(
+                "SELECT MAX(atualizado_em) FROM campanha_destinatarios "
+                "WHERE campanha_id = ? AND status IN ('enviado', 'falhou')",
+                (campanha_id,),
+            ).fetchone()[0]
+
+        template, imagem_url, status, criado_em, iniciado_em, concluido_em = campanha
+        enviados = contagem.get("enviado", 0)
+        decorrido = (ultimo or time.time()) - iniciado_em if iniciado_em else 0
+
+        return {
+            "id": campanha_id,
+            "template": template,
+            "imagem_url": imagem_url,
+            "status": status,
+            "total": sum(contagem.values()),
+            "enviados": enviados,
+            "falhos": contagem.get("falhou", 0),
+            "pendentes": contagem.get("pendente", 0) + contagem.get("enviando", 0),
+            "incertos": contagem.get("incerto", 0),
+            "msgs_por_segundo": round(enviados / decorrido, 2) if decorrido > 0 else 0.0,
+            # Bytes que deixaram de trafegar graças à imagem otimizada
+            "imagem": otimizador_imagem.economia_campanha(imagem_url, enviados),
+            "criado_em": criado_em,
+            "iniciado_em": iniciado_em,
+            "concluido_em": concluido_em,
+        }
+
+    def marcar_incertos(self, campanha_id):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE campanha_destinatarios SET status = 'incerto' "
+                "WHERE campanha_id = ? AND status = 'enviando'",
+                (campanha_id,),
+            )
+
+# ============================================================
+# EXECUÇÃO
+# ============================================================
+
+_REGISTRO = None
+_LOCK = threading.Lock()
+
+
+def _registro():
+    global _REGISTRO
+    if _REGISTRO is None:
+        with _LOCK:
+            if _REGISTRO is None:
+                _REGISTRO = RegistroCampanhas()
+    return _REGISTRO
+
+
+def _enviar_um(campanha_id, numero, imagem_url, template):
+    registro = _registro()
+    if not registro.reservar(campanha_id, numero):
+        return
+
+    try:
+        r = enviar_template_campanha(numero, imagem_url, template)
+    except Exception as e:
+        registro.concluir_envio(campanha_id, numero, "falhou", erro=str(e)[:500])
+        metricas.incrementar("campanha_falhos")
+        return
+
+    if r.status_code < 400:
+        try:
+            wamid = r.json()["messages"][0]["id"]
+        except Exception:
+            wamid = None
+        registro.concluir_envio(campanha_id, numero, "enviado", wamid=wamid)
+        metricas.incrementar("campanha_enviados")
+    else:
+        registro.concluir_envio(campanha_id, numero, "falhou", erro=f"{r.status_code} {r.text[:300]}")
+        metricas.incrementar("campanha_falhos")
+
+
+def _bater_ate(registro, campanha_id, parar):
+    while not parar.wait(_BATIMENTO_S / 4):
+        try:
+            registro.bater(campanha_id)
+        except Exception as e:
+            log.warning("⚠️ Falha ao registrar batimento da campanha %s: %s", campanha_id, e)
+
+
+def executar_campanha(campanha_id):
+    registro = _registro()
+    if not registro.assumir(campanha_id):
+        return
+
+    # Quem estava "enviando" quando o processo anterior caiu pode ter recebido
+    registro.marcar_incertos(campanha_id)
+    template, imagem_url = registro.dados(campanha_id)
+    log.info("🚀 Campanha %s iniciada", campanha_id, extra={"dados": {"template": template}})
+
+    parar = threading.Event()
+    batimento = threading.Thread(
+        target=_bater_ate, args=(registro, campanha_id, parar), name=f"campanha-{campanha_id}-batimento", daemon=True
+    )
+    batimento.start()
+    try:
+        with ThreadPoolExecutor(max_workers=CAMPANHA_CONCORRENCIA, thread_name_prefix=f"campanha-{campanha_id}") as pool:
+            while True:
+                lote = registro.pendentes(campanha_id)
+                if not lote:
+                    break
+                list(pool.map(lambda n: _enviar_um(campanha_id, n, imagem_url, template), lote))
+    finally:
+        parar.set()
+        batimento.join()
+
+    registro.finalizar(campanha_id)
+    log.info("✅ Campanha %s concluída", campanha_id, extra={"dados": registro.resumo(campanha_id)})
+
+
+def iniciar_em_background(campanha_id):
+    t = threading.Thread(target=executar_campanha, args=(campanha_id,), name=f"campanha-{campanha_id}", daemon=True)
+    t.start()
+    return t
+
+# ============================================================
+# API
+# ============================================================
+
+def criar_campanha(numeros, imagem_url="", template=CAMPANHA_TEMPLATE, iniciar=True):
+    campanha_id = _registro().criar(numeros, imagem_url, template)
+    log.info("📋 Campanha %s criada com %s destinatários", campanha_id, len(numeros))
+    if iniciar:
+        iniciar_em_background(campanha_id)
+    return campanha_id
+
+
+def status_campanha(campanha_id):
+    return _registro().resumo(campanha_id)
+
+
+def retomar_campanhas():
+    """Retoma campanhas pendentes/interrompidas (ex.: depois de um restart)."""
+    orfas = _registro().orfas()
+    for campanha_id in orfas:
+        iniciar_em_background(campanha_id)
+    return orfas
+
+# ============================================================
+# LINHA DE COMANDO
+# ============================================================
+# python disparo_campanha.py enviar [arquivo.csv] [imagem_url]
+# python disparo_campanha.py status <id>
+# python disparo_campanha.py retomar
+
+if __name__ == "__main__":
+    comando = sys.argv[1] if len(sys.argv) > 1 else ""
+
+    if comando == "enviar":
+        arquivo = sys.argv[2] if len(sys.argv) > 2 else ARQUIVO_MALA_DIRETA
+        imagem = sys.argv[3] if len(sys.argv) > 3 else ""
+        numeros = carregar_mala_direta(arquivo)
+        cid = criar_campanha(numeros, imagem, iniciar=False)
+        print(f"📋 Campanha {cid}: {len(numeros)} destinatários")
+        executar_campanha(cid)
+        print(status_campanha(cid))
+
+    elif comando == "status" and len(sys.argv) > 2:
+        print(status_campanha(sys.argv[2]))
+
+    elif comando == "retomar":
+        for cid in _registro().orfas():
+            executar_campanha(cid)
+            print(status_campanha(cid))
+
+    else:
+        print("Uso: python disparo_campanha.py enviar [arquivo.csv] [imagem_url] | status <id> | retomar")
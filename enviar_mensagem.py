@@ -1,34 +1,15 @@
-import os
-import json
-import requests
 from dotenv import load_dotenv
 
+from whatsapp_client import obter_cliente
+
 # Carrega as variáveis do .env
 load_dotenv()
 
-# Dados do WhatsApp Cloud API
-ACCESS_TOKEN = os.getenv("WA_ACCESS_TOKEN")
-PHONE_NUMBER_ID = os.getenv("WA_PHONE_NUMBER_ID")
-
 # ============================================================
 # ENVIAR TEXTO
 # ============================================================
 def enviar_texto(telefone, mensagem):
-    url = f"https://graph.facebook.com/v19.0/{PHONE_NUMBER_ID}/messages"
-
-    payload = {
-        "messaging_product": "whatsapp",
-        "to": telefone,
-        "type": "text",
-        "text": {"body": mensagem},
-    }
-
-    headers = {
-        "Authorization": f"Bearer {ACCESS_TOKEN}",
-        "Content-Type": "application/json",
-    }
-
-    response = requests.post(url, headers=headers, json=payload)
+    response = obter_cliente().enviar_texto(telefone, mensagem)
     print("📩 Enviar texto →", resposta_log(response))
 
 
@@ -36,34 +17,7 @@ def enviar_texto(telefone, mensagem):
 # ENVIAR BOTÕES INTERATIVOS
 # ============================================================
 def enviar_botoes(telefone, texto, botoes):
-    url = f"https://graph.facebook.com/v19.0/{PHONE_NUMBER_ID}/messages"
-
-    botoes_formatados = []
-    for btn in botoes:
-        botoes_formatados.append(
-            {
-                "type": "reply",
-                "reply": {"id": btn["id"], "title": btn["title"]},
-            }
-        )
-
-    payload = {
-        "messaging_product": "whatsapp",
-        "to": telefone,
-        "type": "interactive",
-        "interactive": {
-            "type": "button",
-            "body": {"text": texto},
-            "action": {"buttons": botoes_formatados},
-        },
-    }
-
-    headers = {
-        "Authorization": f"Bearer {ACCESS_TOKEN}",
-        "Content-Type": "application/json",
-    }
-
-    response = requests.post(url, headers=headers, json=payload)
+    response = obter_cliente().enviar_botoes(telefone, texto, botoes)
     print("📩 Enviar botões →", resposta_log(response))
 
 
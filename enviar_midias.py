@@ -1,25 +1,5 @@
-import requests
-import os
-
-WA_PHONE_NUMBER_ID = os.getenv("WA_PHONE_NUMBER_ID")
-WA_ACCESS_TOKEN = os.getenv("WA_ACCESS_TOKEN")
+from whatsapp_client import obter_cliente
 
 def enviar_imagem_oficina(numero, imagem_url):
-    url = f"https://graph.facebook.com/v20.0/{WA_PHONE_NUMBER_ID}/messages"
-
-    payload = {
-        "messaging_product": "whatsapp",
-        "to": numero,
-        "type": "image",
-        "image": {
-            "link": imagem_url
-        }
-    }
-
-    headers = {
-        "Authorization": f"Bearer {WA_ACCESS_TOKEN}",
-        "Content-Type": "application/json"
-    }
-
-    r = requests.post(url, json=payload, headers=headers)
+    r = obter_cliente().enviar_imagem(numero, imagem_url)
     r.raise_for_status()
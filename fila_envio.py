@@ -0,0 +1,487 @@
+# -*- coding: utf-8 -*-
+import atexit
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+import requests
+
+import metricas
+from fila_por_chave import FilaPorChave
+from limitador import tempo_espera
+from log_chatbot import obter_logger
+from sqlite_local import conectar, CHATBOT_DB_PATH
+
+log = obter_logger("fila_envio")
+
+# ============================================================
+# CONFIGURAÇÃO
+# ============================================================
+
+# 1 = envios saem por uma fila em background; 0 = envio síncrono no turno
+ENVIO_ASSINCRONO = os.getenv("ENVIO_ASSINCRONO", "1") == "1"
+ENVIO_WORKERS = int(os.getenv("ENVIO_WORKERS", "4"))
+ENVIO_FILA_MAX = int(os.getenv("ENVIO_FILA_MAX", "10000"))
+# Limite total de reenvios de uma mensagem (incluindo status "failed" da Meta)
+ENVIO_MAX_REENVIOS = int(os.getenv("ENVIO_MAX_REENVIOS", "5"))
+ENVIO_VARREDURA_S = int(os.getenv("ENVIO_VARREDURA_S", "30"))
+# Registros finalizados (e status de wamids desconhecidos) ficam este tempo
+ENVIO_RETER_S = int(os.getenv("ENVIO_RETER_S", str(7 * 24 * 3600)))
+
+# Cada processo grava um batimento a cada ENVIO_VARREDURA_S. Sem batimento
+# há mais que isso, o dono é dado como morto e os envios que ele tinha
+# ("pendente"/"enviando") voltam para a fila de quem está vivo.
+ENVIO_DONO_VIVO_S = int(os.getenv("ENVIO_DONO_VIVO_S", str(3 * ENVIO_VARREDURA_S)))
+
+# Erros de entrega da Meta que valem reenvio (instabilidade / limite de taxa)
+_ERROS_TRANSITORIOS = {"131000", "131016", "130429", "131048", "131056"}
+
+# Progressão de status: nunca regride (um "delivered" atrasado não apaga "read")
+_ORDEM_STATUS = {"pendente": 0, "enviando": 1, "aceito": 2, "sent": 3, "delivered": 4, "read": 5}
+
+# ============================================================
+# REGISTRO DE ENVIOS (SQLITE, INDEXADO POR WAMID)
+# ============================================================
+
+def _processo_vivo(dono):
+    # dono = "host:pid:boot". Na mesma máquina dá para conferir o pid na hora
+    # (kill -9 / OOM não deixam batimento velho esperando ENVIO_DONO_VIVO_S).
+    host, pid, _ = (dono.split(":") + ["", ""])[:3]
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class RegistroEnvios:
+
+    def __init__(self, caminho=CHATBOT_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = conectar(caminho)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS envios ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " wamid TEXT UNIQUE,"
+            " numero TEXT NOT NULL,"
+            " tipo TEXT,"
+            " payload TEXT,"
+            " status TEXT NOT NULL,"
+            " tentativas INTEGER NOT NULL DEFAULT 0,"
+            " erro TEXT,"
+            " proximo_em REAL,"
+            " criado_em REAL NOT NULL,"
+            " atualizado_em REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS envios_status ON envios (status, proximo_em)")
+        try:
+            # Banco criado antes da coluna dono
+            self._conn.execute("ALTER TABLE envios ADD COLUMN dono TEXT")
+        except sqlite3.OperationalError:
+            pass
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS envios_donos (dono TEXT PRIMARY KEY, batimento_em REAL NOT NULL)"
+        )
+
+        # Um id por processo (criado depois do fork do gunicorn, no 1º uso)
+        self.dono = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.bater()
+
+    def bater(self):
+        agora = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO envios_donos (dono, batimento_em) VALUES (?, ?) "
+                "ON CONFLICT(dono) DO UPDATE SET batimento_em = excluded.batimento_em",
+                (self.dono, agora),
+            )
+            self._conn.execute(
+                "DELETE FROM envios_donos WHERE batimento_em < ?", (agora - ENVIO_DONO_VIVO_S,)
+            )
+
+    def encerrar(self):
+        # Saída limpa (deploy/restart): os envios deste processo viram órfãos na hora
+        with self._lock:
+            self._conn.execute("DELETE FROM envios_donos WHERE dono = ?", (self.dono,))
+
+    def donos_vivos(self):
+        with self._lock:
+            donos = [linha[0] for linha in self._conn.execute(
+                "SELECT dono FROM envios_donos WHERE batimento_em >= ?",
+                (time.time() - ENVIO_DONO_VIVO_S,),
+            )]
+        return [dono for dono in donos if _processo_vivo(dono)]
+
+    def recuperar_orfaos(self):
+        """Envios "pendente"/"enviando" de processos mortos (restart, deploy,
+        queda) voltam a ser tentados agora, na ordem original."""
+        agora = time.time()
+        vivos = self.donos_vivos()
+        marcas = ",".join("?" * len(vivos)) or "NULL"
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE envios SET status = 'reenviar', proximo_em = ?, dono = NULL, atualizado_em = ? "
+                "WHERE payload IS NOT NULL AND status IN ('pendente', 'enviando') "
+                f"AND (dono IS NULL OR dono NOT IN ({marcas}))",
+                (agora, agora, *vivos),
+            ).rowcount
+
+    def criar(self, item):
+        agora = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO envios (numero, tipo, payload, status, dono, criado_em, atualizado_em) "
+                "VALUES (?, ?, ?, 'pendente', ?, ?, ?)",
+                (item["numero"], item["tipo"], json.dumps(item, ensure_ascii=False), self.dono, agora, agora),
+            )
+            return cur.lastrowid
+
+    def reservar(self, envio_id):
+        # Só um worker/processo envia cada registro
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE envios SET status = 'enviando', dono = ?, atualizado_em = ? "
+                "WHERE id = ? AND status IN ('pendente', 'reenviar', 'estacionado')",
+                (self.dono, time.time(), envio_id),
+            )
+            return cur.rowcount == 1
+
+    def bloqueio_anterior(self, envio_id, numero):
+        """Envio mais antigo do mesmo número ainda não aceito: devolve quando
+        ele volta a ser tentado (None se não há nenhum). "pendente"/"enviando"
+        só bloqueia se o dono está vivo; de dono morto vira órfão e é
+        recuperado pela varredura."""
+        agora = time.time()
+        vivos = self.donos_vivos()
+        marcas = ",".join("?" * len(vivos)) or "NULL"
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT status, proximo_em FROM envios "
+                "WHERE numero = ? AND id < ? AND payload IS NOT NULL AND ("
+                " status IN ('reenviar', 'estacionado')"
+                f" OR (status IN ('pendente', 'enviando') AND dono IN ({marcas}))"
+                ") ORDER BY id LIMIT 1",
+                (numero, envio_id, *vivos),
+            ).fetchone()
+        if linha is None:
+            return None
+
+        status, proximo_em = linha
+        if status in ("reenviar", "estacionado") and proximo_em:
+            return proximo_em
+        return agora + ENVIO_VARREDURA_S
+
+    def estacionar(self, envio_id, proximo_em):
+        # Fica atrás do envio anterior. Sai quando ele terminar (liberar_proximo)
+        # ou, de reserva, pela varredura em proximo_em
+        with self._lock:
+            self._conn.execute(
+                "UPDATE envios SET status = 'estacionado', proximo_em = ?, atualizado_em = ? WHERE id = ?",
+                (proximo_em, time.time(), envio_id),
+            )
+
+    def liberar_proximo(self, numero):
+        """O envio anterior terminou: o estacionado mais antigo do número volta para a fila."""
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT id, payload FROM envios WHERE numero = ? AND status = 'estacionado' "
+                "ORDER BY id LIMIT 1",
+                (numero,),
+            ).fetchone()
+            if linha is None:
+                return None
+            cur = self._conn.execute(
+                "UPDATE envios SET status = 'pendente', dono = ?, atualizado_em = ? "
+                "WHERE id = ? AND status = 'estacionado'",
+                (self.dono, time.time(), linha[0]),
+            )
+        return linha if cur.rowcount == 1 else None
+
+    def marcar_aceito(self, envio_id, wamid):
+        agora = time.time()
+        with self._lock:
+            # O status pode ter chegado antes de gravarmos o wamid
+            antecipado = self._conn.execute(
+                "SELECT status FROM envios WHERE wamid = ? AND id != ?", (wamid, envio_id)
+            ).fetchone()
+            status = antecipado[0] if antecipado else "aceito"
+            if antecipado:
+                self._conn.execute("DELETE FROM envios WHERE wamid = ? AND id != ?", (wamid, envio_id))
+
+            self._conn.execute(
+                "UPDATE envios SET wamid = ?, status = ?, tentativas = tentativas + 1, "
+                "erro = NULL, atualizado_em = ? WHERE id = ?",
+                (wamid, status, agora, envio_id),
+            )
+
+    def marcar_falha(self, envio_id, erro, definitiva=False):
+        agora = time.time()
+        with self._lock:
+            linha = self._conn.execute("SELECT tentativas FROM envios WHERE id = ?", (envio_id,)).fetchone()
+            tentativas = (linha[0] if linha else 0) + 1
+
+            if definitiva or tentativas > ENVIO_MAX_REENVIOS:
+                status, proximo = "falhou", None
+            else:
+                status, proximo = "reenviar", agora + tempo_espera(tentativas)
+
+            self._conn.execute(
+                "UPDATE envios SET status = ?, tentativas = ?, erro = ?, proximo_em = ?, "
+                "atualizado_em = ? WHERE id = ?",
+                (status, tentativas, str(erro)[:500], proximo, agora, envio_id),
+            )
+            return status
+
+    def aplicar_status(self, wamid, status, numero="", erro_codigo=""):
+        agora = time.time()
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT id, status, tentativas FROM envios WHERE wamid = ?", (wamid,)
+            ).fetchone()
+
+            if linha is None:
+                # Status de um envio que ainda não foi gravado (ou de outro sistema)
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO envios (wamid, numero, status, criado_em, atualizado_em) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (wamid, numero, status, agora, agora),
+                )
+                return None
+
+            envio_id, atual, tentativas = linha
+
+            if status == "failed":
+                if erro_codigo in _ERROS_TRANSITORIOS and tentativas <= ENVIO_MAX_REENVIOS:
+                    # Libera o wamid para o reenvio gravar o novo
+                    self._conn.execute(
+                        "UPDATE envios SET status = 'reenviar', wamid = NULL, erro = ?, "
+                        "proximo_em = ?, atualizado_em = ? WHERE id = ?",
+                        (f"failed {erro_codigo}", agora + tempo_espera(tentativas), agora, envio_id),
+                    )
+                    return "reenviar"
+
+                self._conn.execute(
+                    "UPDATE envios SET status = 'failed', erro = ?, atualizado_em = ? WHERE id = ?",
+                    (f"failed {erro_codigo}", agora, envio_id),
+                )
+                return "failed"
+
+            if _ORDEM_STATUS.get(status, 0) > _ORDEM_STATUS.get(atual, 0):
+                self._conn.execute(
+                    "UPDATE envios SET status = ?, atualizado_em = ? WHERE id = ?",
+                    (status, agora, envio_id),
+                )
+            return status
+
+    def para_reenviar(self, limite=200):
+        agora = time.time()
+        with self._lock:
+            # Órfãos de processos mortos já viraram "reenviar" (recuperar_orfaos)
+            return self._conn.execute(
+                "SELECT id, payload FROM envios "
+                "WHERE payload IS NOT NULL AND status IN ('reenviar', 'estacionado') AND proximo_em <= ? "
+                "ORDER BY id LIMIT ?",
+                (agora, limite),
+            ).fetchall()
+
+    def limpar(self, antes_de):
+        # Envios finalizados e status de wamids que nunca foram nossos
+        # (ex.: destinatários de campanha) não precisam ficar para sempre
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM envios WHERE atualizado_em < ? AND ("
+                " payload IS NULL"
+                " OR status NOT IN ('pendente', 'enviando', 'reenviar', 'estacionado'))",
+                (antes_de,),
+            ).rowcount
+
+    def devolver_para_fila(self, envio_id):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE envios SET status = 'pendente', dono = ?, atualizado_em = ? WHERE id = ?",
+                (self.dono, time.time(), envio_id),
+            )
+
+    def buscar(self, wamid):
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT numero, tipo, status, tentativas, erro, criado_em, atualizado_em "
+                "FROM envios WHERE wamid = ?",
+                (wamid,),
+            ).fetchone()
+        if linha is None:
+            return None
+        campos = ("numero", "tipo", "status", "tentativas", "erro", "criado_em", "atualizado_em")
+        return dict(zip(campos, linha))
+
+    def contagem_por_status(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM envios GROUP BY status").fetchall())
+
+# ============================================================
+# PIPELINE DE ENVIO
+# ============================================================
+
+_FILA = FilaPorChave("fila_envio", ENVIO_WORKERS, ENVIO_FILA_MAX)
+_REGISTRO = None
+_VARREDURA = None
+_LOCK = threading.Lock()
+
+
+def _registro():
+    global _REGISTRO, _VARREDURA
+
+    if _REGISTRO is None:
+        with _LOCK:
+            if _REGISTRO is None:
+                _REGISTRO = RegistroEnvios()
+                atexit.register(_REGISTRO.encerrar)
+                metricas.registrar_gauge("envios_por_status", _REGISTRO.contagem_por_status)
+                # Subida do processo: o que ficou de quem morreu volta já
+                orfaos = _REGISTRO.recuperar_orfaos()
+                if orfaos:
+                    log.info("📤 %s envios de processos anteriores voltaram para a fila", orfaos)
+                _VARREDURA = threading.Thread(target=_varrer, name="fila-envio-varredura", daemon=True)
+                _VARREDURA.start()
+    return _REGISTRO
+
+
+def _wamid(resposta):
+    try:
+        return resposta.json()["messages"][0]["id"]
+    except Exception:
+        return None
+
+
+def _liberar_proximo(registro, numero):
+    liberado = registro.liberar_proximo(numero)
+    if liberado is not None:
+        envio_id, payload = liberado
+        _FILA.enfileirar(numero, _enviar, envio_id, json.loads(payload))
+
+
+def _enviar(envio_id, item):
+    from caixa_saida import enviar_item
+
+    registro = _registro()
+
+    # Mensagem anterior deste número ainda não foi aceita: esta espera atrás
+    # dela (B nunca sai antes de A)
+    proximo_em = registro.bloqueio_anterior(envio_id, item["numero"])
+    if proximo_em is not None:
+        registro.estacionar(envio_id, proximo_em)
+        metricas.incrementar("fila_envio_estacionados")
+        return
+
+    if not registro.reservar(envio_id):
+        return
+
+    # Uma camada de retentativa só: o WhatsAppClient já retenta 429/5xx/
+    # conexão. Se ainda assim falhar, vira "reenviar" com backoff e os
+    # envios seguintes deste número esperam atrás dele.
+    try:
+        r = enviar_item(item)
+    except requests.ReadTimeout as e:
+        # A Graph pode ter aceitado: reenviar arriscaria mensagem em dobro
+        registro.marcar_falha(envio_id, f"timeout de leitura, resultado incerto: {e}", definitiva=True)
+        _liberar_proximo(registro, item["numero"])
+        metricas.incrementar("fila_envio_incertos")
+        log.error("❌ Envio sem resposta da Graph API (não reenviado): %s", e, extra={"dados": {"numero": item["numero"]}})
+        return
+    except Exception as e:
+        erro = e
+    else:
+        wamid = _wamid(r)
+        if r.status_code < 400 and wamid:
+            registro.marcar_aceito(envio_id, wamid)
+            _liberar_proximo(registro, item["numero"])
+            metricas.incrementar("fila_envio_aceitos")
+            return
+
+        erro = f"{r.status_code} {r.text[:300]}"
+        if 400 <= r.status_code < 500 and r.status_code != 429:
+            # Requisição inválida: reenviar não resolve
+            registro.marcar_falha(envio_id, erro, definitiva=True)
+            _liberar_proximo(registro, item["numero"])
+            metricas.incrementar("fila_envio_rejeitados")
+            log.error("❌ Envio rejeitado pela Graph API: %s", erro, extra={"dados": {"numero": item["numero"]}})
+            return
+
+    status = registro.marcar_falha(envio_id, erro)
+    if status == "falhou":
+        _liberar_proximo(registro, item["numero"])
+    metricas.incrementar("fila_envio_falhas")
+    log.error(
+        "❌ Envio falhou (%s): %s", status, erro,
+        extra={"dados": {"numero": item["numero"]}},
+    )
+
+
+def _varrer():
+    proxima_limpeza = 0.0
+    while True:
+        # Primeira passada logo na subida: órfãos recuperados saem na hora
+        try:
+            _REGISTRO.bater()
+            orfaos = _REGISTRO.recuperar_orfaos()
+            if orfaos:
+                metricas.incrementar("fila_envio_orfaos_recuperados", orfaos)
+
+            if time.time() >= proxima_limpeza:
+                removidos = _REGISTRO.limpar(time.time() - ENVIO_RETER_S)
+                if removidos:
+                    metricas.incrementar("fila_envio_registros_removidos", removidos)
+                proxima_limpeza = time.time() + 3600
+
+            for envio_id, payload in _REGISTRO.para_reenviar():
+                item = json.loads(payload)
+                _REGISTRO.devolver_para_fila(envio_id)
+                _FILA.enfileirar(item["numero"], _enviar, envio_id, item)
+                metricas.incrementar("fila_envio_reenfileirados")
+        except Exception as e:
+            log.exception("❌ Erro na varredura de reenvios: %s", e)
+
+        time.sleep(ENVIO_VARREDURA_S)
+
+# ============================================================
+# API
+# ============================================================
+
+def enviar(item):
+    """Enfileira um envio (dict da caixa de saída) na fila do destinatário."""
+    envio_id = _registro().criar(item)
+    _FILA.enfileirar(item["numero"], _enviar, envio_id, item)
+    return envio_id
+
+
+def registrar_status(statuses):
+    """Casa os status da Meta (sent/delivered/read/failed) com os envios gravados."""
+    registro = _registro()
+    for st in statuses:
+        wamid = st.get("id")
+        status = st.get("status")
+        if not wamid or not status:
+            continue
+
+        erros = st.get("errors") or [{}]
+        codigo = str(erros[0].get("code", ""))
+        resultado = registro.aplicar_status(wamid, status, st.get("recipient_id", ""), codigo)
+
+        if resultado == "reenviar":
+            metricas.incrementar("fila_envio_reenvios_por_status")
+
+
+def consultar(wamid):
+    return _registro().buscar(wamid)
+
+
+def aguardar_fila():
+    _FILA.aguardar()
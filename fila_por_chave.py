@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+import queue
+import threading
+import time
+from collections import deque
+
+import metricas
+from log_chatbot import obter_logger
+
+log = obter_logger("fila")
+
+# ============================================================
+# FILA POR CHAVE SOBRE UM POOL COMPARTILHADO
+# ============================================================
+# Cada chave (ex.: número do cliente) tem a própria fila, e no máximo um
+# worker por vez roda tarefas dela: as tarefas de uma chave rodam em ordem
+# e nunca em paralelo entre si. As chaves dividem o mesmo pool, então um
+# turno lento (Claude, Groq) ocupa um worker só e não segura os outros
+# clientes.
+
+class FilaPorChave:
+
+    def __init__(self, nome, workers, capacidade):
+        self.nome = nome
+        self.workers = max(1, workers)
+        self.capacidade = max(1, capacidade)
+
+        # chave -> deque de tarefas. Chave presente aqui está na fila de
+        # prontas ou rodando em algum worker (nunca nos dois, nunca em dois).
+        self._por_chave = {}
+        self._prontas = queue.SimpleQueue()
+        self._total = 0
+        self._rodando = 0
+
+        self._lock = threading.Lock()
+        self._espaco = threading.Condition(self._lock)
+        self._vazia = threading.Condition(self._lock)
+        self._threads = []
+
+        metricas.registrar_gauge(f"{nome}_profundidade", lambda: self._total)
+        metricas.registrar_gauge(f"{nome}_profundidade_max_chave", self.profundidade_max_chave)
+        metricas.registrar_gauge(f"{nome}_chaves_ativas", lambda: len(self._por_chave))
+        metricas.registrar_gauge(f"{nome}_workers", lambda: len(self._threads))
+
+    def profundidade(self):
+        return self._total
+
+    def profundidade_max_chave(self):
+        with self._lock:
+            return max((len(d) for d in self._por_chave.values()), default=0)
+
+    def executar(self, tarefa, args, kwargs):
+        inicio = time.monotonic()
+        try:
+            tarefa(*args, **kwargs)
+            metricas.incrementar(f"{self.nome}_processadas")
+        except Exception as e:
+            metricas.incrementar(f"{self.nome}_erros")
+            log.exception("❌ Erro no worker %s: %s", self.nome, e)
+        finally:
+            metricas.observar(f"{self.nome}_execucao_ms", (time.monotonic() - inicio) * 1000)
+
+    def _worker(self):
+        while True:
+            chave = self._prontas.get()
+
+            with self._lock:
+                tarefa, args, kwargs, enfileirado_em = self._por_chave[chave].popleft()
+                self._rodando += 1
+
+            metricas.observar(f"{self.nome}_espera_ms", (time.monotonic() - enfileirado_em) * 1000)
+            try:
+                self.executar(tarefa, args, kwargs)
+            finally:
+                with self._lock:
+                    self._rodando -= 1
+                    self._total -= 1
+                    # Uma tarefa por vez: a chave volta para o fim das prontas
+                    # e as outras chaves não esperam a fila inteira dela
+                    if self._por_chave[chave]:
+                        self._prontas.put(chave)
+                    else:
+                        del self._por_chave[chave]
+                    self._espaco.notify()
+                    if self._total == 0:
+                        self._vazia.notify_all()
+
+    def _garantir_workers(self):
+        # Start preguiçoso: com gunicorn os workers nascem depois do fork
+        if len(self._threads) >= self.workers:
+            return
+
+        with self._lock:
+            while len(self._threads) < self.workers:
+                t = threading.Thread(
+                    target=self._worker,
+                    name=f"{self.nome}-{len(self._threads)}",
+                    daemon=True,
+                )
+                t.start()
+                self._threads.append(t)
+
+    def enfileirar(self, chave, tarefa, *args, **kwargs):
+        self._garantir_workers()
+
+        with self._lock:
+            if self._total >= self.capacidade:
+                # Fila lotada: bloqueia até abrir espaço. Executar inline aqui
+                # furaria a ordem das tarefas que já estão na fila desta chave.
+                metricas.incrementar(f"{self.nome}_cheia")
+                log.warning("⚠️ Fila %s cheia, aguardando espaço", self.nome)
+                while self._total >= self.capacidade:
+                    self._espaco.wait()
+
+            tarefas = self._por_chave.get(chave)
+            nova = tarefas is None
+            if nova:
+                tarefas = self._por_chave[chave] = deque()
+            tarefas.append((tarefa, args, kwargs, time.monotonic()))
+            self._total += 1
+
+            # Chave já ativa: o worker que a está rodando pega a tarefa depois
+            if nova:
+                self._prontas.put(chave)
+
+        metricas.incrementar(f"{self.nome}_enfileiradas")
+
+    def aguardar(self):
+        with self._lock:
+            while self._total:
+                self._vazia.wait()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import os
+
+import metricas
+from fila_por_chave import FilaPorChave
+
+# ============================================================
+# CONFIGURAÇÃO
+# ============================================================
+
+# 1 = webhook só enfileira e responde 200; 0 = processa inline (modo antigo)
+WEBHOOK_ASSINCRONO = os.getenv("WEBHOOK_ASSINCRONO", "1") == "1"
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_FILA_MAX = int(os.getenv("WEBHOOK_FILA_MAX", "10000"))
+
+# As mensagens de um mesmo número rodam em ordem, uma por vez (nunca
+# disputam SESSOES[numero]); números diferentes dividem o pool de workers.
+_FILA = FilaPorChave("fila_webhook", WEBHOOK_WORKERS, WEBHOOK_FILA_MAX)
+
+# ============================================================
+# API
+# ============================================================
+
+def enfileirar(chave, tarefa, *args, **kwargs):
+    if not WEBHOOK_ASSINCRONO:
+        _FILA.executar(tarefa, args, kwargs)
+        return
+
+    _FILA.enfileirar(chave, tarefa, *args, **kwargs)
+
+
+def enfileirar_lote(itens):
+    # itens: (chave, tarefa, args) na ordem em que chegaram no webhook
+    total = 0
+    for chave, tarefa, args in itens:
+        enfileirar(chave, tarefa, *args)
+        total += 1
+
+    if total:
+        metricas.incrementar("fila_webhook_lotes")
+    return total
+
+
+def aguardar_fila():
+    _FILA.aguardar()
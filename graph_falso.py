@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+Servidor local que imita a WhatsApp Cloud API (Graph) para testes de carga.
+
+Implementa o que o bot usa:
+  POST /{versao}/{phone_id}/messages   -> {"messages": [{"id": "wamid..."}]}
+  POST /{versao}/{phone_id}/media      -> {"id": "<media_id>"} (multipart)
+  GET  /{versao}/{media_id}            -> {"url": ".../midia/<media_id>", ...}
+  GET  /midia/<media_id>               -> bytes da mídia
+
+Latência, taxa de erro 5xx e de 429 (com Retry-After) são configuráveis, e
+toda chamada fica registrada para conferência.
+
+Uso: GRAPH_API_BASE=http://127.0.0.1:8089 no bot e
+     python graph_falso.py [--porta 8089] [--latencia-ms 80] [--jitter-ms 40]
+                           [--erro 0.01] [--taxa-429 0.02] [--retry-after 1]
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+# Áudio fictício para GET /midia/<id> de mídias que não foram enviadas antes
+_MIDIA_PADRAO = b"OggS" + b"\x00" * 1020
+
+# ============================================================
+# REGISTRO DE CHAMADAS
+# ============================================================
+
+class Chamada:
+    __slots__ = ("metodo", "caminho", "status", "corpo", "ts")
+
+    def __init__(self, metodo, caminho, status, corpo, ts):
+        self.metodo = metodo
+        self.caminho = caminho
+        self.status = status
+        self.corpo = corpo
+        self.ts = ts
+
+    def __repr__(self):
+        return f"Chamada({self.metodo} {self.caminho} -> {self.status})"
+
+# ============================================================
+# HANDLER HTTP
+# ============================================================
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, status, corpo, tipo="application/json", headers=None):
+        if isinstance(corpo, (dict, list)):
+            corpo = json.dumps(corpo).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(corpo)))
+        for nome, valor in (headers or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _falha_injetada(self):
+        falso = self.server.falso
+        sorteio = random.random()
+
+        if sorteio < falso.taxa_429:
+            headers = {"Retry-After": str(falso.retry_after)} if falso.retry_after is not None else {}
+            return 429, {"error": {"code": 130429, "message": "Rate limit hit"}}, headers
+        if sorteio < falso.taxa_429 + falso.taxa_erro:
+            return 500, {"error": {"code": 131000, "message": "Something went wrong"}}, {}
+        return None
+
+    def _tratar(self, metodo):
+        falso = self.server.falso
+        caminho = urlparse(self.path).path
+        partes = [p for p in caminho.split("/") if p]
+
+        tamanho = int(self.headers.get("Content-Length", 0))
+        bruto = self.rfile.read(tamanho) if tamanho else b""
+
+        falso.esperar_latencia()
+
+        falha = self._falha_injetada() if caminho.endswith(("/messages", "/media")) else None
+        if falha is not None:
+            status, corpo, headers = falha
+            falso.registrar(metodo, caminho, status, _decodificar(bruto))
+            self._responder(status, corpo, headers=headers)
+            return
+
+        # POST /{versao}/{phone_id}/messages
+        if metodo == "POST" and len(partes) == 3 and partes[2] == "messages":
+            corpo = _decodificar(bruto)
+            wamid = falso.novo_wamid()
+            falso.registrar(metodo, caminho, 200, corpo)
+            self._responder(200, {
+                "messaging_product": "whatsapp",
+                "contacts": [{"input": corpo.get("to", ""), "wa_id": corpo.get("to", "")}],
+                "messages": [{"id": wamid}],
+            })
+            return
+
+        # POST /{versao}/{phone_id}/media (multipart/form-data)
+        if metodo == "POST" and len(partes) == 3 and partes[2] == "media":
+            conteudo, mime = _ler_multipart(self.headers.get("Content-Type", ""), bruto)
+            media_id = falso.guardar_midia(conteudo, mime)
+            falso.registrar(metodo, caminho, 200, {"type": mime, "bytes": len(conteudo)})
+            self._responder(200, {"id": media_id})
+            return
+
+        # GET /midia/<media_id> (download do arquivo)
+        if metodo == "GET" and len(partes) == 2 and partes[0] == "midia":
+            conteudo, mime = falso.midia(partes[1])
+            falso.registrar(metodo, caminho, 200, None)
+            self._responder(200, conteudo, tipo=mime)
+            return
+
+        # GET /{versao}/{media_id} (informações da mídia)
+        if metodo == "GET" and len(partes) == 2:
+            conteudo, mime = falso.midia(partes[1])
+            falso.registrar(metodo, caminho, 200, None)
+            self._responder(200, {
+                "messaging_product": "whatsapp",
+                "id": partes[1],
+                "url": f"{falso.base_url}/midia/{partes[1]}",
+                "mime_type": mime,
+                "file_size": len(conteudo),
+            })
+            return
+
+        falso.registrar(metodo, caminho, 404, None)
+        self._responder(404, {"error": {"code": 100, "message": f"Unknown path {caminho}"}})
+
+    def do_POST(self):
+        self._tratar("POST")
+
+    def do_GET(self):
+        self._tratar("GET")
+
+
+def _decodificar(bruto):
+    if not bruto:
+        return {}
+    try:
+        return json.loads(bruto)
+    except ValueError:
+        return {"bruto": len(bruto)}
+
+
+def _ler_multipart(content_type, bruto):
+    mensagem = BytesParser().parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + bruto
+    )
+    for parte in mensagem.walk():
+        if parte.get_param("name", header="content-disposition") == "file":
+            return parte.get_payload(decode=True) or b"", parte.get_content_type()
+    return b"", "application/octet-stream"
+
+# ============================================================
+# SERVIDOR
+# ============================================================
+
+class GraphFalso:
+
+    def __init__(self, host="127.0.0.1", porta=0, latencia_s=0.0, jitter_s=0.0,
+                 taxa_erro=0.0, taxa_429=0.0, retry_after=None):
+        self.host = host
+        self.porta = porta
+        self.latencia_s = latencia_s
+        self.jitter_s = jitter_s
+        self.taxa_erro = taxa_erro
+        self.taxa_429 = taxa_429
+        self.retry_after = retry_after
+
+        self.chamadas = []
+        self.base_url = ""
+
+        self._lock = threading.Lock()
+        self._midias = {}
+        self._ids = itertools.count(1)
+        self._servidor = None
+
+    # ------------------------------------------------------------
+    # CICLO DE VIDA
+    # ------------------------------------------------------------
+
+    def iniciar(self):
+        self._servidor = ThreadingHTTPServer((self.host, self.porta), _Handler)
+        self._servidor.daemon_threads = True
+        self._servidor.falso = self
+        self.porta = self._servidor.server_address[1]
+        self.base_url = f"http://{self.host}:{self.porta}"
+
+        threading.Thread(target=self._servidor.serve_forever, name="graph-falso", daemon=True).start()
+        return self.base_url
+
+    def parar(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+    def __enter__(self):
+        self.iniciar()
+        return self
+
+    def __exit__(self, *exc):
+        self.parar()
+
+    # ------------------------------------------------------------
+    # USADO PELO HANDLER
+    # ------------------------------------------------------------
+
+    def esperar_latencia(self):
+        espera = self.latencia_s + (random.uniform(0, self.jitter_s) if self.jitter_s else 0.0)
+        if espera > 0:
+            time.sleep(espera)
+
+    def novo_wamid(self):
+        return f"wamid.FALSO{next(self._ids):012d}"
+
+    def guardar_midia(self, conteudo, mime):
+        media_id = f"{next(self._ids):015d}"
+        with self._lock:
+            self._midias[media_id] = (conteudo, mime)
+        return media_id
+
+    def midia(self, media_id):
+        with self._lock:
+            return self._midias.get(media_id, (_MIDIA_PADRAO, "audio/ogg"))
+
+    def registrar(self, metodo, caminho, status, corpo):
+        with self._lock:
+            self.chamadas.append(Chamada(metodo, caminho, status, corpo, time.time()))
+
+    # ------------------------------------------------------------
+    # CONFERÊNCIA
+    # ------------------------------------------------------------
+
+    def limpar(self):
+        with self._lock:
+            self.chamadas.clear()
+
+    def mensagens(self, numero=None, status=200):
+        """Corpos de /messages aceitos (opcionalmente só os de um número)."""
+        with self._lock:
+            chamadas = list(self.chamadas)
+        return [
+            c.corpo for c in chamadas
+            if c.caminho.endswith("/messages") and c.status == status
+            and (numero is None or c.corpo.get("to") == numero)
+        ]
+
+    def contagem(self):
+        with self._lock:
+            chamadas = list(self.chamadas)
+        total = {}
+        for c in chamadas:
+            rota = c.caminho.rsplit("/", 1)[-1]
+            if rota not in ("messages", "media"):
+                rota = "midia"
+            chave = f"{c.metodo} {rota} {c.status}"
+            total[chave] = total.get(chave, 0) + 1
+        return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="WhatsApp Cloud API falsa para testes de carga")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8089)
+    parser.add_argument("--latencia-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--erro", type=float, default=0.0, help="fração de respostas 500")
+    parser.add_argument("--taxa-429", type=float, default=0.0, help="fração de respostas 429")
+    parser.add_argument("--retry-after", type=int, default=None, help="Retry-After (s) nas 429")
+    args = parser.parse_args()
+
+    falso = GraphFalso(
+        host=args.host,
+        porta=args.porta,
+        latencia_s=args.latencia_ms / 1000,
+        jitter_s=args.jitter_ms / 1000,
+        taxa_erro=args.erro,
+        taxa_429=args.taxa_429,
+        retry_after=args.retry_after,
+    )
+    print(f"Graph falsa em {falso.iniciar()} (Ctrl+C para sair)")
+
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps(falso.contagem(), ensure_ascii=False))
+    except KeyboardInterrupt:
+        falso.parar()
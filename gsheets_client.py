@@ -1,38 +1,153 @@
 # gsheets_client.py
-import os, json
+import os, json, re, threading
+import httplib2
+import google_auth_httplib2
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
 SHEET_ID = os.getenv("CLINICA_SHEET_ID")
+GSHEETS_TIMEOUT_S = float(os.getenv("GSHEETS_TIMEOUT_S", "15"))
+
+# Credenciais lidas uma vez por processo: o token de acesso é renovado
+# nelas e reaproveitado por todas as threads.
+_CREDS = None
+_LOCK = threading.Lock()
+# httplib2 não é thread-safe: um service (e uma conexão keep-alive) por thread
+_LOCAL = threading.local()
+
+def _credenciais():
+  global _CREDS
+  if _CREDS is None:
+    with _LOCK:
+      if _CREDS is None:
+        creds_json = os.getenv("GOOGLE_CREDENTIALS_JSON")
+        if not creds_json:
+          raise RuntimeError("Env var GOOGLE_CREDENTIALS_JSON ausente")
+        info = json.loads(creds_json)
+        _CREDS = Credentials.from_service_account_info(info, scopes=SCOPES)
+  return _CREDS
+
+def _novo_service():
+  http = google_auth_httplib2.AuthorizedHttp(_credenciais(), http=httplib2.Http(timeout=GSHEETS_TIMEOUT_S))
+  return build("sheets", "v4", http=http, cache_discovery=False)
 
 def _service():
-  creds_json = os.getenv("GOOGLE_CREDENTIALS_JSON")
-  if not creds_json:
-    raise RuntimeError("Env var GOOGLE_CREDENTIALS_JSON ausente")
-  info = json.loads(creds_json)
-  creds = Credentials.from_service_account_info(info, scopes=SCOPES)
-  return build("sheets", "v4", credentials=creds, cache_discovery=False)
+  service = getattr(_LOCAL, "service", None)
+  if service is None:
+    service = _LOCAL.service = _novo_service()
+  return service
 
 def _append(aba: str, values: list):
-  body = {"values": [values]}
+  return _append_linhas(aba, [values])
+
+def _append_linhas(aba: str, linhas: list):
+  body = {"values": linhas}
   return _service().spreadsheets().values().append(
     spreadsheetId=SHEET_ID, range=f"{aba}!A:Z",
     valueInputOption="USER_ENTERED",
     insertDataOption="INSERT_ROWS", body=body
   ).execute()
 
+def _linha_inicial(resposta):
+  # updates.updatedRange vem como "Pacientes!A12:K14"
+  faixa = resposta.get("updates", {}).get("updatedRange", "")
+  m = re.search(r"![A-Z]+(\d+)", faixa)
+  return int(m.group(1)) if m else None
+
+# linhas de cada aba (mesma ordem de colunas da planilha)
+def _linha_paciente(cpf, nome, data_nasc, endereco, contato,
+                    tipo_atend, conv_part, esp_ou_exame, origem, ts_criado, ts_atualizado):
+  return [cpf, nome, data_nasc, endereco, contato,
+          tipo_atend, conv_part, esp_ou_exame, origem, ts_criado, ts_atualizado]
+
+def _linha_solicitacao(ts, cpf, tipo, detalhe, status, obs):
+  return [ts, cpf, tipo, detalhe, status, obs]
+
+def _linha_pesquisa(ts, cpf, tipo, texto):
+  return [ts, cpf, tipo, texto]
+
+def _linha_interacao(ts, cpf, evento, detalhe):
+  return [ts, cpf, evento, detalhe]
+
 # atalhos usados pelo bot
 def salvar_paciente(cpf, nome, data_nasc, endereco, contato,
                     tipo_atend, conv_part, esp_ou_exame, origem, ts_criado, ts_atualizado):
-  return _append("Pacientes", [cpf, nome, data_nasc, endereco, contato,
-                               tipo_atend, conv_part, esp_ou_exame, origem, ts_criado, ts_atualizado])
+  return _append("Pacientes", _linha_paciente(cpf, nome, data_nasc, endereco, contato,
+                                              tipo_atend, conv_part, esp_ou_exame, origem, ts_criado, ts_atualizado))
 
 def salvar_solicitacao(ts, cpf, tipo, detalhe, status, obs):
-  return _append("Solicitacoes", [ts, cpf, tipo, detalhe, status, obs])
+  return _append("Solicitacoes", _linha_solicitacao(ts, cpf, tipo, detalhe, status, obs))
 
 def salvar_pesquisa(ts, cpf, tipo, texto):
-  return _append("Pesquisa", [ts, cpf, tipo, texto])
+  return _append("Pesquisa", _linha_pesquisa(ts, cpf, tipo, texto))
 
 def registrar_interacao(ts, cpf, evento, detalhe):
-  return _append("Interacoes", [ts, cpf, evento, detalhe])
+  return _append("Interacoes", _linha_interacao(ts, cpf, evento, detalhe))
+
+# ============================================================
+# LOTE: VÁRIAS LINHAS EM VÁRIAS ABAS, UM APPEND POR ABA
+# ============================================================
+# Um turno da conversa que grava paciente + solicitação + interação vira
+# 3 chamadas (uma por aba) em vez de uma por linha, e o resultado volta
+# linha a linha, na ordem em que foram adicionadas:
+#
+#   lote = LoteSheets()
+#   lote.salvar_paciente(...)
+#   lote.registrar_interacao(...)
+#   for r in lote.gravar(): ...   # {"aba", "ok", "linha" | "erro"}
+
+class LoteSheets:
+
+  def __init__(self):
+    self._linhas = []  # (aba, valores)
+
+  def __len__(self):
+    return len(self._linhas)
+
+  def adicionar(self, aba: str, valores: list):
+    """Enfileira uma linha; devolve a posição dela no resultado de gravar()."""
+    self._linhas.append((aba, list(valores)))
+    return len(self._linhas) - 1
+
+  def salvar_paciente(self, *args, **kwargs):
+    return self.adicionar("Pacientes", _linha_paciente(*args, **kwargs))
+
+  def salvar_solicitacao(self, *args, **kwargs):
+    return self.adicionar("Solicitacoes", _linha_solicitacao(*args, **kwargs))
+
+  def salvar_pesquisa(self, *args, **kwargs):
+    return self.adicionar("Pesquisa", _linha_pesquisa(*args, **kwargs))
+
+  def registrar_interacao(self, *args, **kwargs):
+    return self.adicionar("Interacoes", _linha_interacao(*args, **kwargs))
+
+  def gravar(self):
+    """Um append por aba. Cada append é atômico: se falhar, todas as linhas
+    daquela aba voltam com ok=False e as das outras abas seguem gravadas."""
+    por_aba = {}
+    for pos, (aba, valores) in enumerate(self._linhas):
+      por_aba.setdefault(aba, []).append((pos, valores))
+
+    resultados = [None] * len(self._linhas)
+    for aba, itens in por_aba.items():
+      try:
+        resposta = _append_linhas(aba, [valores for _, valores in itens])
+      except Exception as e:
+        for pos, _ in itens:
+          resultados[pos] = {"aba": aba, "ok": False, "erro": str(e)}
+        continue
+
+      inicio = _linha_inicial(resposta)
+      for i, (pos, _) in enumerate(itens):
+        resultados[pos] = {"aba": aba, "ok": True, "linha": inicio + i if inicio else None}
+
+    self._linhas = []
+    return resultados
+
+def salvar_lote(linhas):
+  """linhas: [(aba, valores), ...] -> um resultado por linha, na mesma ordem."""
+  lote = LoteSheets()
+  for aba, valores in linhas:
+    lote.adicionar(aba, valores)
+  return lote.gravar()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+import os
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+import metricas
+
+# ============================================================
+# CONFIGURAÇÃO
+# ============================================================
+
+# Orçamento de envio por phone_number_id (msgs/s) e rajada máxima
+WA_TAXA_MSGS_S = float(os.getenv("WA_TAXA_MSGS_S", "20"))
+WA_RAJADA = int(os.getenv("WA_RAJADA", "40"))
+
+WA_RETENTATIVAS = int(os.getenv("WA_RETENTATIVAS", "4"))
+WA_BACKOFF_BASE_S = float(os.getenv("WA_BACKOFF_BASE_S", "0.5"))
+WA_BACKOFF_MAX_S = float(os.getenv("WA_BACKOFF_MAX_S", "30"))
+
+_JANELA_TAXA_S = 10
+
+# ============================================================
+# TOKEN BUCKET
+# ============================================================
+
+class TokenBucket:
+
+    def __init__(self, nome, taxa=WA_TAXA_MSGS_S, capacidade=WA_RAJADA):
+        self.nome = nome
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self.tokens = float(capacidade)
+        self.atualizado_em = time.monotonic()
+        self.aguardando = 0
+        self._lock = threading.Lock()
+        self._envios = deque()
+
+        metricas.registrar_gauge(f"limitador_{nome}_taxa_atual_msgs_s", self.taxa_atual)
+        metricas.registrar_gauge(f"limitador_{nome}_aguardando", lambda: self.aguardando)
+
+    def _repor(self, agora):
+        decorrido = agora - self.atualizado_em
+        if decorrido > 0:
+            self.tokens = min(self.capacidade, self.tokens + decorrido * self.taxa)
+            self.atualizado_em = agora
+
+    def adquirir(self):
+        """Bloqueia até haver orçamento: acima da taxa o envio espera na fila, não falha."""
+        inicio = time.monotonic()
+        esperou = False
+
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._repor(agora)
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self._envios.append(agora)
+                    if esperou:
+                        self.aguardando -= 1
+                    break
+
+                if not esperou:
+                    self.aguardando += 1
+                    esperou = True
+                espera = (1 - self.tokens) / self.taxa
+
+            time.sleep(espera)
+
+        espera_total = time.monotonic() - inicio
+        if esperou:
+            metricas.incrementar(f"limitador_{self.nome}_enfileirados")
+            metricas.observar(f"limitador_{self.nome}_espera_ms", espera_total * 1000)
+        return espera_total
+
+    def taxa_atual(self):
+        with self._lock:
+            limite = time.monotonic() - _JANELA_TAXA_S
+            while self._envios and self._envios[0] < limite:
+                self._envios.popleft()
+            return round(len(self._envios) / _JANELA_TAXA_S, 2)
+
+
+_BUCKETS = {}
+_LOCK = threading.Lock()
+
+
+def obter_bucket(phone_number_id):
+    bucket = _BUCKETS.get(phone_number_id)
+    if bucket is None:
+        with _LOCK:
+            bucket = _BUCKETS.get(phone_number_id)
+            if bucket is None:
+                bucket = TokenBucket(f"wa_{phone_number_id}")
+                _BUCKETS[phone_number_id] = bucket
+    return bucket
+
+# ============================================================
+# RETENTATIVA COM BACKOFF EXPONENCIAL + JITTER
+# ============================================================
+
+def deve_retentar(status_code):
+    return status_code == 429 or status_code >= 500
+
+
+def _ler_retry_after(valor):
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(valor).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def tempo_espera(tentativa, retry_after=None):
+    # Retry-After do servidor tem prioridade; senão "full jitter" sobre 2^n
+    espera = _ler_retry_after(retry_after)
+    if espera is not None:
+        return min(espera, WA_BACKOFF_MAX_S)
+
+    teto = min(WA_BACKOFF_MAX_S, WA_BACKOFF_BASE_S * (2 ** tentativa))
+    return random.uniform(teto / 2, teto)
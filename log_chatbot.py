@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+
+# ============================================================
+# CONFIGURAÇÃO
+# ============================================================
+
+LOG_NIVEL = os.getenv("LOG_NIVEL", "INFO").upper()
+# Níveis por categoria, ex.: "webhook=INFO,responder=WARNING,fila=DEBUG"
+LOG_NIVEIS = os.getenv("LOG_NIVEIS", "")
+# json (uma linha por registro) ou texto (legível no terminal)
+LOG_FORMATO = os.getenv("LOG_FORMATO", "json")
+# Loga o payload completo em 1 de cada N requisições (0 = nunca)
+LOG_PAYLOAD_AMOSTRA = int(os.getenv("LOG_PAYLOAD_AMOSTRA", "100"))
+
+_RAIZ = "chatbot"
+
+# ============================================================
+# FORMATADORES
+# ============================================================
+
+class FormatadorJSON(logging.Formatter):
+
+    def format(self, record):
+        registro = {
+            "ts": round(record.created, 3),
+            "nivel": record.levelname,
+            "categoria": record.name[len(_RAIZ) + 1:] or _RAIZ,
+            "msg": record.getMessage(),
+        }
+
+        dados = getattr(record, "dados", None)
+        if dados:
+            registro["dados"] = dados
+
+        if record.exc_info:
+            registro["erro"] = self.formatException(record.exc_info)
+
+        return json.dumps(registro, ensure_ascii=False, default=str)
+
+
+class FormatadorTexto(logging.Formatter):
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s [%(name)s] %(message)s")
+
+    def format(self, record):
+        linha = super().format(record)
+        dados = getattr(record, "dados", None)
+        if dados:
+            linha = f"{linha} {dados}"
+        return linha
+
+# ============================================================
+# HANDLER COM FILA (FORMATAÇÃO E I/O EM THREAD SEPARADA)
+# ============================================================
+
+class _HandlerFila(logging.handlers.QueueHandler):
+
+    def prepare(self, record):
+        # O QueueHandler padrão formata a mensagem na thread que loga.
+        # Aqui só enfileira o record: quem formata é a thread do listener.
+        return record
+
+
+_FILA = queue.SimpleQueue()
+_LISTENER = None
+
+
+def _configurar():
+    global _LISTENER
+
+    saida = logging.StreamHandler(sys.stdout)
+    saida.setFormatter(FormatadorJSON() if LOG_FORMATO == "json" else FormatadorTexto())
+
+    raiz = logging.getLogger(_RAIZ)
+    raiz.setLevel(LOG_NIVEL)
+    raiz.propagate = False
+    raiz.addHandler(_HandlerFila(_FILA))
+
+    for item in LOG_NIVEIS.split(","):
+        if "=" not in item:
+            continue
+        categoria, nivel = item.split("=", 1)
+        logging.getLogger(f"{_RAIZ}.{categoria.strip()}").setLevel(nivel.strip().upper())
+
+    _LISTENER = logging.handlers.QueueListener(_FILA, saida, respect_handler_level=False)
+    _LISTENER.start()
+    atexit.register(_LISTENER.stop)
+
+
+_configurar()
+
+# ============================================================
+# API
+# ============================================================
+
+def obter_logger(categoria):
+    return logging.getLogger(f"{_RAIZ}.{categoria}")
+
+
+_CONTADOR_PAYLOAD = itertools.count()
+
+
+def amostrar_payload(logger, corpo, rotulo="📩 PAYLOAD RECEBIDO"):
+    # Payload completo só em 1 de cada LOG_PAYLOAD_AMOSTRA requisições
+    if LOG_PAYLOAD_AMOSTRA <= 0 or not logger.isEnabledFor(logging.INFO):
+        return
+    if next(_CONTADOR_PAYLOAD) % LOG_PAYLOAD_AMOSTRA != 0:
+        return
+
+    if isinstance(corpo, (bytes, bytearray)):
+        corpo = bytes(corpo).decode("utf-8", errors="replace")
+
+    logger.info(rotulo, extra={"dados": {"payload": corpo, "amostra": LOG_PAYLOAD_AMOSTRA}})
+
+
+def esvaziar(timeout=2.0):
+    # Espera a thread de log escrever o que já está na fila (útil em scripts)
+    limite = time.monotonic() + timeout
+    while not _FILA.empty() and time.monotonic() < limite:
+        time.sleep(0.01)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+import json
+import re
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional; sem ele cai no json da stdlib
+    orjson = None
+
+# ============================================================
+# DECODIFICADOR JSON RÁPIDO
+# ============================================================
+
+def decodificar(corpo):
+    if not corpo:
+        return {}
+    if orjson is not None:
+        return orjson.loads(corpo)
+    return json.loads(corpo)
+
+# ============================================================
+# PRÉ-CHECAGEM EM BYTES: ENTREGAS SÓ COM STATUS
+# ============================================================
+
+_RE_STATUS = re.compile(rb'"status"\s*:\s*"([a-z_]+)"')
+# Chave "messages" (o valor "field": "messages" vem em todo payload da Meta)
+_RE_CHAVE_MESSAGES = re.compile(rb'"messages"\s*:')
+
+
+def eh_somente_status(corpo):
+    # Recibos de entrega/leitura não trazem "messages": dá para responder
+    # 200 sem parsear nem logar o payload inteiro.
+    return (
+        b'"statuses"' in corpo
+        and _RE_CHAVE_MESSAGES.search(corpo) is None
+        and b'apps_script_disparo' not in corpo
+    )
+
+
+def contar_status(corpo):
+    contagem = {}
+    for status in _RE_STATUS.findall(corpo):
+        chave = status.decode("ascii")
+        contagem[chave] = contagem.get(chave, 0) + 1
+    return contagem
+
+# ============================================================
+# REGISTRO COMPACTO DE MENSAGEM RECEBIDA
+# ============================================================
+
+class InboundMessage:
+    __slots__ = ("id", "wa_id", "name", "type", "text", "media_id", "timestamp")
+
+    def __init__(self, id, wa_id, name, type, text="", media_id="", timestamp=0):
+        self.id = id
+        self.wa_id = wa_id
+        self.name = name
+        self.type = type
+        self.text = text
+        self.media_id = media_id
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        return (
+            f"InboundMessage(id={self.id!r}, wa_id={self.wa_id!r}, type={self.type!r}, "
+            f"text={self.text!r}, media_id={self.media_id!r})"
+        )
+
+# ============================================================
+# EXTRAÇÃO EM UMA PASSADA
+# ============================================================
+
+_TIPOS_MIDIA = ("audio", "image", "video", "document", "sticker")
+
+
+def _texto_interactive(interactive):
+    resposta = interactive.get(interactive.get("type") or "")
+    if not resposta:
+        return ""
+    return resposta.get("id") or resposta.get("title") or ""
+
+
+def _converter(msg, nomes):
+    tipo = msg.get("type") or "desconhecido"
+    texto = ""
+    media_id = ""
+
+    if tipo == "text":
+        texto = (msg.get("text") or {}).get("body", "").strip()
+    elif tipo == "interactive":
+        texto = _texto_interactive(msg.get("interactive") or {})
+    elif tipo == "button":
+        texto = (msg.get("button") or {}).get("text") or ""
+    elif tipo in _TIPOS_MIDIA:
+        media_id = (msg.get(tipo) or {}).get("id", "")
+
+    wa_id = msg["from"]
+
+    try:
+        timestamp = int(msg.get("timestamp") or 0)
+    except (TypeError, ValueError):
+        timestamp = 0
+
+    return InboundMessage(
+        id=msg.get("id") or "",
+        wa_id=wa_id,
+        name=nomes.get(wa_id, "Cliente"),
+        type=tipo,
+        text=texto,
+        media_id=media_id,
+        timestamp=timestamp,
+    )
+
+
+def extrair_status(data):
+    """Lista os status (sent/delivered/read/failed) de todas as entries/changes."""
+    statuses = []
+    for entry in data.get("entry") or ():
+        for change in entry.get("changes") or ():
+            statuses.extend((change.get("value") or {}).get("statuses") or ())
+    return statuses
+
+
+def extrair_mensagens(data, dedup=None):
+    """Percorre entries/changes/messages uma única vez e devolve InboundMessage em ordem."""
+    mensagens = []
+    total_changes = 0
+
+    for entry in data.get("entry") or ():
+        for change in entry.get("changes") or ():
+            total_changes += 1
+            value = change.get("value") or {}
+            messages = value.get("messages")
+
+            if not messages:
+                continue
+
+            nomes = {
+                c.get("wa_id"): (c.get("profile") or {}).get("name", "Cliente")
+                for c in value.get("contacts") or ()
+            }
+
+            for msg in messages:
+                if not msg.get("from"):
+                    continue
+
+                if dedup is not None and not dedup.registrar(msg.get("id")):
+                    continue
+
+                mensagens.append(_converter(msg, nomes))
+
+    return mensagens, total_changes
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from collections import deque
+
+# ============================================================
+# MÉTRICAS EM MEMÓRIA (CONTADORES, GAUGES E AMOSTRAS)
+# ============================================================
+
+_LOCK = threading.Lock()
+_CONTADORES = {}
+_GAUGES = {}
+_GAUGES_DINAMICOS = {}
+_AMOSTRAS = {}
+
+_AMOSTRAS_MAX = 1024
+_INICIO = time.time()
+
+
+def incrementar(nome, valor=1):
+    with _LOCK:
+        _CONTADORES[nome] = _CONTADORES.get(nome, 0) + valor
+
+
+def definir(nome, valor):
+    with _LOCK:
+        _GAUGES[nome] = valor
+
+
+def registrar_gauge(nome, funcao):
+    # Gauge calculado na hora da leitura (ex.: tamanho de fila)
+    with _LOCK:
+        _GAUGES_DINAMICOS[nome] = funcao
+
+
+def observar(nome, valor):
+    with _LOCK:
+        amostra = _AMOSTRAS.get(nome)
+        if amostra is None:
+            amostra = {
+                "total": 0,
+                "soma": 0.0,
+                "max": 0.0,
+                "recentes": deque(maxlen=_AMOSTRAS_MAX),
+            }
+            _AMOSTRAS[nome] = amostra
+
+        amostra["total"] += 1
+        amostra["soma"] += valor
+        if valor > amostra["max"]:
+            amostra["max"] = valor
+        amostra["recentes"].append(valor)
+
+
+def _percentil(ordenados, p):
+    if not ordenados:
+        return 0.0
+    idx = min(len(ordenados) - 1, int(round(p * (len(ordenados) - 1))))
+    return ordenados[idx]
+
+
+def _resumo(amostra):
+    ordenados = sorted(amostra["recentes"])
+    total = amostra["total"]
+    return {
+        "total": total,
+        "media": round(amostra["soma"] / total, 3) if total else 0.0,
+        "max": round(amostra["max"], 3),
+        "p50": round(_percentil(ordenados, 0.50), 3),
+        "p95": round(_percentil(ordenados, 0.95), 3),
+        "p99": round(_percentil(ordenados, 0.99), 3),
+    }
+
+
+def instantaneo():
+    with _LOCK:
+        contadores = dict(_CONTADORES)
+        gauges = dict(_GAUGES)
+        dinamicos = dict(_GAUGES_DINAMICOS)
+        amostras = {nome: _resumo(a) for nome, a in _AMOSTRAS.items()}
+
+    for nome, funcao in dinamicos.items():
+        try:
+            gauges[nome] = funcao()
+        except Exception as e:
+            gauges[nome] = f"erro: {e}"
+
+    return {
+        "uptime_s": round(time.time() - _INICIO, 1),
+        "contadores": contadores,
+        "gauges": gauges,
+        "amostras": amostras,
+    }
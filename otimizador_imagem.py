@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import io
+import os
+import sys
+import threading
+import time
+
+import metricas
+from log_chatbot import obter_logger
+from sqlite_local import conectar, CHATBOT_DB_PATH
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow é opcional: sem ele a imagem sobe como veio
+    Image = None
+
+log = obter_logger("imagem")
+
+# ============================================================
+# CONFIGURAÇÃO
+# ============================================================
+
+IMAGEM_OTIMIZAR = os.getenv("IMAGEM_OTIMIZAR", "1") == "1"
+# O WhatsApp reduz as fotos para ~1600 px no maior lado: acima disso é peso à toa
+IMAGEM_LADO_MAX = int(os.getenv("IMAGEM_LADO_MAX", "1600"))
+IMAGEM_QUALIDADE = int(os.getenv("IMAGEM_QUALIDADE", "80"))
+IMAGEM_CACHE_DIR = os.getenv("IMAGEM_CACHE_DIR", "dados/imagens")
+
+# ============================================================
+# REDIMENSIONA + RECODIFICA (JPEG)
+# ============================================================
+
+def _recodificar(conteudo):
+    imagem = Image.open(io.BytesIO(conteudo))
+    imagem = ImageOps.exif_transpose(imagem)
+    original = imagem.size
+
+    if imagem.mode in ("RGBA", "LA", "P"):
+        # JPEG não tem transparência: aplica sobre fundo branco
+        imagem = imagem.convert("RGBA")
+        fundo = Image.new("RGB", imagem.size, (255, 255, 255))
+        fundo.paste(imagem, mask=imagem.getchannel("A"))
+        imagem = fundo
+    elif imagem.mode != "RGB":
+        imagem = imagem.convert("RGB")
+
+    imagem.thumbnail((IMAGEM_LADO_MAX, IMAGEM_LADO_MAX), Image.LANCZOS)
+
+    saida = io.BytesIO()
+    imagem.save(saida, "JPEG", quality=IMAGEM_QUALIDADE, optimize=True, progressive=True)
+    return saida.getvalue(), original, imagem.size
+
+# ============================================================
+# CACHE POR HASH DO CONTEÚDO (ARQUIVO + SQLITE)
+# ============================================================
+
+class OtimizadorImagem:
+
+    def __init__(self, caminho=CHATBOT_DB_PATH, pasta=IMAGEM_CACHE_DIR):
+        self.pasta = pasta
+        os.makedirs(pasta, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = conectar(caminho)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS imagens_otimizadas ("
+            " hash TEXT PRIMARY KEY,"
+            " mime TEXT NOT NULL,"
+            " bytes_original INTEGER NOT NULL,"
+            " bytes_otimizado INTEGER NOT NULL,"
+            " largura INTEGER,"
+            " altura INTEGER,"
+            " criado_em REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS imagens_url ("
+            " url TEXT PRIMARY KEY,"
+            " hash TEXT NOT NULL,"
+            " atualizado_em REAL NOT NULL)"
+        )
+
+    def _arquivo(self, digest):
+        return os.path.join(self.pasta, digest)
+
+    def _buscar(self, digest):
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT mime FROM imagens_otimizadas WHERE hash = ?", (digest,)
+            ).fetchone()
+        if linha is None:
+            return None
+
+        try:
+            with open(self._arquivo(digest), "rb") as f:
+                return f.read(), linha[0]
+        except OSError:
+            return None
+
+    def otimizar(self, conteudo, mime, url=""):
+        """Devolve (conteudo, mime) otimizados; a mesma imagem só é processada uma vez."""
+        digest = hashlib.blake2b(conteudo, digest_size=16).hexdigest()
+
+        encontrado = self._buscar(digest)
+        if encontrado is not None:
+            metricas.incrementar("imagem_cache_acertos")
+            resultado, mime_final = encontrado
+        else:
+            resultado, mime_final, dimensoes = self._processar(conteudo, mime)
+
+            with open(self._arquivo(digest), "wb") as f:
+                f.write(resultado)
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO imagens_otimizadas "
+                    "(hash, mime, bytes_original, bytes_otimizado, largura, altura, criado_em) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (digest, mime_final, len(conteudo), len(resultado), dimensoes[0], dimensoes[1], time.time()),
+                )
+
+            economia = len(conteudo) - len(resultado)
+            metricas.incrementar("imagem_otimizadas")
+            metricas.incrementar("imagem_bytes_economizados", economia)
+            log.info(
+                "🖼️ Imagem otimizada: %s -> %s bytes", len(conteudo), len(resultado),
+                extra={"dados": {"url": url, "hash": digest, "dimensoes": dimensoes}},
+            )
+
+        if url:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO imagens_url (url, hash, atualizado_em) VALUES (?, ?, ?)",
+                    (url, digest, time.time()),
+                )
+
+        return resultado, mime_final
+
+    def _processar(self, conteudo, mime):
+        try:
+            resultado, original, final = _recodificar(conteudo)
+        except Exception as e:
+            log.warning("⚠️ Imagem não pôde ser otimizada, segue original: %s", e)
+            return conteudo, mime, (None, None)
+
+        # Já estava no tamanho certo e mais leve: mantém a original
+        if len(resultado) >= len(conteudo) and max(original) <= IMAGEM_LADO_MAX:
+            return conteudo, mime, original
+
+        return resultado, "image/jpeg", final
+
+    def economia(self, url):
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT o.bytes_original, o.bytes_otimizado, o.largura, o.altura "
+                "FROM imagens_url u JOIN imagens_otimizadas o ON o.hash = u.hash WHERE u.url = ?",
+                (url,),
+            ).fetchone()
+        if linha is None:
+            return None
+
+        bytes_original, bytes_otimizado, largura, altura = linha
+        return {
+            "bytes_original": bytes_original,
+            "bytes_otimizado": bytes_otimizado,
+            "economia_por_envio": bytes_original - bytes_otimizado,
+            "dimensoes": [largura, altura] if largura else None,
+        }
+
+# ============================================================
+# API
+# ============================================================
+
+_OTIMIZADOR = None
+_LOCK = threading.Lock()
+
+
+def _otimizador():
+    global _OTIMIZADOR
+    if _OTIMIZADOR is None:
+        with _LOCK:
+            if _OTIMIZADOR is None:
+                _OTIMIZADOR = OtimizadorImagem()
+    return _OTIMIZADOR
+
+
+def otimizar(conteudo, mime, url=""):
+    if not IMAGEM_OTIMIZAR or Image is None or not conteudo:
+        return conteudo, mime
+    return _otimizador().otimizar(conteudo, mime, url)
+
+
+def economia_campanha(url, enviados):
+    """Bytes economizados numa campanha: (original - otimizada) x destinatários."""
+    if not url or Image is None:
+        return None
+    info = _otimizador().economia(url)
+    if info is not None:
+        info["economia_total"] = info["economia_por_envio"] * enviados
+    return info
+
+# ============================================================
+# LINHA DE COMANDO (PRÉ-PROCESSA AS IMAGENS DAS CAMPANHAS)
+# ============================================================
+# python otimizador_imagem.py <url> [<url> ...]
+
+if __name__ == "__main__":
+    from cache_midia import baixar_imagem
+    from responder_oficina import normalizar_dropbox
+
+    if Image is None:
+        print("⚠️ Pillow não instalado: as imagens seguem sem otimização")
+
+    for url in map(normalizar_dropbox, sys.argv[1:]):
+        conteudo, mime = baixar_imagem(url)
+        resultado, mime_final = otimizar(conteudo, mime, url)
+        print(f"{url}: {len(conteudo)} -> {len(resultado)} bytes ({mime} -> {mime_final})")
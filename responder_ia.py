@@ -1,14 +1,27 @@
 import os
 from typing import Optional
 
+from disjuntor import obter_disjuntor
+from log_chatbot import obter_logger
+
+log = obter_logger("ia")
+
+IA_TIMEOUT_S = float(os.getenv("IA_TIMEOUT_S", "8"))
+
+# Claude fora do ar: devolve None na hora e o fluxo responde com o menu fixo
+_DISJUNTOR = obter_disjuntor("claude")
+
 def responder_com_ia(mensagem: str, nome: Optional[str] = None, historico: list = None) -> Optional[str]:
     api_key = os.getenv("ANTHROPIC_API_KEY", "").strip()
     if not api_key:
         return None
 
+    if not _DISJUNTOR.permitir():
+        return None
+
     try:
         import anthropic
-        client = anthropic.Anthropic(api_key=api_key)
+        client = anthropic.Anthropic(api_key=api_key, timeout=IA_TIMEOUT_S)
 
         sistema = (
             "Você é o assistente virtual da Sullato Oficina e Peças, em São Paulo. "
@@ -38,9 +51,11 @@ def responder_com_ia(mensagem: str, nome: Optional[str] = None, historico: list
             system=sistema,
             messages=msgs,
         )
+        _DISJUNTOR.sucesso()
         texto = (resp.content[0].text or "").strip()
         return texto if texto else None
 
     except Exception as e:
-        print("⚠️ Claude indisponível:", e)
+        _DISJUNTOR.falha()
+        log.warning("⚠️ Claude indisponível: %s", e)
         return None
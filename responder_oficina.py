@@ -2,21 +2,40 @@
 import os
 import time
 import random
+import threading
 import requests
+from itertools import permutations
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+from log_chatbot import obter_logger
+from whatsapp_client import obter_cliente
+import caixa_saida
+import cache_midia
+import catalogo_mensagens
+import metricas
+import sheets_webapp
+from cache_ttl import CacheTTL
+from dedup import DedupMensagens, DEDUP_SQLITE_PATH
+from disjuntor import obter_disjuntor
+from sqlite_local import CHATBOT_DB_PATH
+
 load_dotenv()
 
+log = obter_logger("responder")
+
 # ============================================================
 # CONSULTA ENDEREÇO PELO CEP (ViaCEP)
 # ============================================================
 
+# ViaCEP fora do ar: o fluxo segue sem o endereço em vez de esperar o timeout
+_DISJUNTOR_CEP = obter_disjuntor("viacep")
+
 def consultar_endereco_por_cep(cep):
     try:
         cep_limpo = cep.replace("-", "").strip()
         url = f"https://viacep.com.br/ws/{cep_limpo}/json/"
-        r = requests.get(url, timeout=5)
+        r = _DISJUNTOR_CEP.chamar(requests.get, url, timeout=5)
         if r.status_code != 200:
             return ""
 
@@ -40,11 +59,6 @@ def consultar_endereco_por_cep(cep):
 # VARIÁVEIS DE AMBIENTE
 # ============================================================
 
-WHATSAPP_API_URL = f"https://graph.facebook.com/v20.0/{os.getenv('WA_PHONE_NUMBER_ID')}"
-WHATSAPP_TOKEN = os.getenv("WA_ACCESS_TOKEN")
-GOOGLE_SHEETS_URL = os.getenv("OFICINA_SHEET_WEBHOOK_URL")
-SECRET_KEY = os.getenv("OFICINA_SHEETS_SECRET")
-
 TIMEOUT_SESSAO = 3600
 SESSOES = {}
 
@@ -69,76 +83,59 @@ def _add_hist_ia(numero, user_msg, assistant_msg):
 # ============================================================
 
 def enviar_texto(numero, texto):
+    # Dentro de um turno o envio sai no fim, junto com os demais
+    if caixa_saida.adicionar("texto", numero, texto=texto):
+        return
+
     try:
-        payload = {
-            "messaging_product": "whatsapp",
-            "to": numero,
-            "text": {"body": texto},
-        }
-        headers = {
-            "Authorization": f"Bearer {WHATSAPP_TOKEN}",
-            "Content-Type": "application/json",
-            "Accept": "application/json"
-        }
-        requests.post(f"{WHATSAPP_API_URL}/messages", json=payload, headers=headers)
+        obter_cliente().enviar_texto(numero, texto)
     except Exception as e:
-        print("Erro enviar texto:", e)
+        log.error("Erro enviar texto: %s", e)
+
+
+def enviar_catalogo(numero, chave, **campos):
+    # Mensagem fixa: sai com o JSON pré-serializado, só com numero/campos encaixados
+    mensagem = catalogo_mensagens.obter(chave)
+    if caixa_saida.adicionar("texto", numero, texto=mensagem.texto(**campos), catalogo=chave, campos=campos):
+        return
+
+    try:
+        obter_cliente().enviar_bruto(catalogo_mensagens.preencher(chave, numero, **campos))
+    except Exception as e:
+        log.error("Erro enviar texto: %s", e)
 
 # ============================================================
 # ENVIAR BOTÕES
 # ============================================================
 
 def enviar_botoes(numero, texto, botoes):
-    try:
-        botoes_formatados = [
-            {"type": "reply", "reply": {"id": i["id"], "title": i["title"]}}
-            for i in botoes
-        ]
-
-        payload = {
-            "messaging_product": "whatsapp",
-            "to": numero,
-            "type": "interactive",
-            "interactive": {
-                "type": "button",
-                "body": {"text": texto},
-                "action": {"buttons": botoes_formatados},
-            },
-        }
-
-        headers = {
-            "Authorization": f"Bearer {WHATSAPP_TOKEN}",
-            "Content-Type": "application/json",
-        }
+    if caixa_saida.adicionar("botoes", numero, texto=texto, botoes=botoes):
+        return
 
-        requests.post(f"{WHATSAPP_API_URL}/messages", json=payload, headers=headers)
+    try:
+        obter_cliente().enviar_botoes(numero, texto, botoes)
 
     except Exception as e:
-        print("Erro enviar botões:", e)
+        log.error("Erro enviar botões: %s", e)
 
 # ============================================================
 # ENVIAR IMAGEM (DUMMY — APENAS PARA COMPATIBILIDADE)
 # ============================================================
 
-def obter_imagem_oficina_mes():
+def _buscar_imagem_oficina_mes():
     try:
-        payload = {
-            "secret": SECRET_KEY,
-            "route": "get_imagem_mes"
-        }
-
-        r = requests.post(GOOGLE_SHEETS_URL, json=payload, timeout=10)
+        r = sheets_webapp.postar("get_imagem_mes")
         data = r.json()
 
         url = data.get("url", "")
         if not url:
-            print("⚠️ Planilha não retornou URL de imagem")
+            log.warning("⚠️ Planilha não retornou URL de imagem")
             return ""
 
         return normalizar_dropbox(url)
 
     except Exception as e:
-        print("❌ Erro ao buscar imagem da planilha:", e)
+        log.error("❌ Erro ao buscar imagem da planilha: %s", e)
         return ""
 
 
@@ -152,37 +149,42 @@ def normalizar_dropbox(url):
     return u
 
 
+# A imagem muda uma vez por mês: consulta o Apps Script no máximo a cada
+# IMAGEM_MES_TTL_S e, quando vence, entrega a antiga enquanto atualiza.
+IMAGEM_MES_TTL_S = int(os.getenv("IMAGEM_MES_TTL_S", str(6 * 3600)))
+_CACHE_IMAGEM_MES = CacheTTL("imagem_mes", _buscar_imagem_oficina_mes, IMAGEM_MES_TTL_S)
+
+
+def obter_imagem_oficina_mes():
+    return _CACHE_IMAGEM_MES.obter()
+
+
+def invalidar_imagem_oficina_mes():
+    # Chamar quando a imagem do mês for trocada na planilha
+    anterior = _CACHE_IMAGEM_MES.valor_atual()
+    if anterior:
+        cache_midia.invalidar(anterior)
+    _CACHE_IMAGEM_MES.invalidar()
+
+
 def enviar_imagem(numero, url):
     if not url:
-        print("⚠️ URL de imagem vazia, envio ignorado")
+        log.warning("⚠️ URL de imagem vazia, envio ignorado")
         return
 
-    try:
-        payload = {
-            "messaging_product": "whatsapp",
-            "to": numero,
-            "type": "image",
-            "image": {
-                "link": url
-            }
-        }
-
-        headers = {
-            "Authorization": f"Bearer {WHATSAPP_TOKEN}",
-            "Content-Type": "application/json"
-        }
+    if caixa_saida.adicionar("imagem", numero, link=url):
+        return
 
-        r = requests.post(
-            f"{WHATSAPP_API_URL}/messages",
-            json=payload,
-            headers=headers,
-            timeout=10
+    try:
+        r = cache_midia.enviar_com_imagem(
+            url,
+            lambda imagem: obter_cliente().enviar_imagem(numero, imagem.get("link"), imagem.get("id")),
         )
 
-        print("📤 ENVIO IMAGEM:", r.status_code, r.text)
+        log.info("📤 ENVIO IMAGEM: %s %s", r.status_code, r.text)
 
     except Exception as e:
-        print("❌ Erro ao enviar imagem:", e)
+        log.error("❌ Erro ao enviar imagem: %s", e)
 
 # ============================================================
 # RESETAR SESSÃO
@@ -192,6 +194,51 @@ def reset_sessao(numero):
     if numero in SESSOES:
         del SESSOES[numero]
 
+# ============================================================
+# REGISTRO DE ACESSO NA PLANILHA (UM POR NÚMERO/DIA/TIPO)
+# ============================================================
+# Cada "oi", menu e sessão expirada gerava outra linha "Acesso" igual.
+# Só o primeiro acesso do dia (horário de Brasília) de cada número vai
+# para a planilha; a marca fica no SQLite e vale entre workers e restarts.
+
+ACESSO_DEDUP = os.getenv("ACESSO_DEDUP", "1") == "1"
+
+_ACESSOS_DO_DIA = None
+_LOCK_ACESSOS = threading.Lock()
+
+
+def _acessos_do_dia():
+    global _ACESSOS_DO_DIA
+
+    if _ACESSOS_DO_DIA is None:
+        with _LOCK_ACESSOS:
+            if _ACESSOS_DO_DIA is None:
+                # A chave já leva o dia: o TTL só precisa cobrir a virada
+                _ACESSOS_DO_DIA = DedupMensagens(
+                    nome="acessos_planilha",
+                    ttl=2 * 24 * 3600,
+                    caminho_sqlite=DEDUP_SQLITE_PATH or CHATBOT_DB_PATH,
+                )
+    return _ACESSOS_DO_DIA
+
+
+def registrar_acesso(numero, nome_whatsapp, interesse_inicial="acesso_inicial", tipo_registro="Acesso"):
+    """Manda a linha de acesso para a planilha; devolve False se já foi hoje."""
+    if ACESSO_DEDUP:
+        dia = (datetime.utcnow() - timedelta(hours=3)).strftime("%Y-%m-%d")
+        if not _acessos_do_dia().registrar(f"{numero}:{dia}:{tipo_registro}"):
+            metricas.incrementar("sheets_acessos_suprimidos")
+            return False
+
+    sheets_webapp.registrar({
+        "fone": numero,
+        "nome_whatsapp": nome_whatsapp,
+        "interesse_inicial": interesse_inicial,
+        "tipo_registro": tipo_registro,
+        "origem": "whatsapp"
+    })
+    return True
+
 # ============================================================
 # HORÁRIO DE ATENDIMENTO — OFICINA
 # ============================================================
@@ -228,18 +275,7 @@ def iniciar_sessao(numero, nome_whatsapp, enviar_menu=True):
     }
 
     if enviar_menu:
-        enviar_texto(
-            numero,
-            f"Olá {nome_whatsapp}! 👋\n\n"
-            "Seja bem-vindo à *TS Sullato Auto Service*.\n\n"
-            "💬 Você também pode escrever sua dúvida ou enviar um áudio explicando o que precisa.\n\n"
-            "Se preferir, utilize uma das opções abaixo:\n\n"
-            "1 – Serviços\n"
-            "2 – Peças\n"
-            "3 – Pós-venda / Garantia\n"
-            "4 – Retorno Oficina\n"
-            "5 – Endereço e Contato"
-        )
+        enviar_catalogo(numero, "boas_vindas", nome=nome_whatsapp)
 
 # ============================================================
 # SALVAR VIA GOOGLE SHEETS
@@ -253,22 +289,12 @@ def salvar_via_webapp(sessao):
             if isinstance(valor, (str, int, float)):
                 campos_validos[campo] = valor
 
-        payload = {
-            "secret": SECRET_KEY,
-            "route": "chatbot",
-            "dados": campos_validos
-        }
-
-        headers = { "Content-Type": "application/json" }
-
-        print("📤 Enviando para:", GOOGLE_SHEETS_URL)
-        print("📦 Payload final:", payload)
+        log.debug("📦 Dados finais: %s", campos_validos)
 
-        resp = requests.post(GOOGLE_SHEETS_URL, json=payload, headers=headers)
-        print("📥 RESPOSTA:", resp.status_code, resp.text)
+        sheets_webapp.registrar(campos_validos)
 
     except Exception as e:
-        print("❌ Erro salvar webapp:", e)
+        log.error("❌ Erro salvar webapp: %s", e)
 # ============================================================
 # RESUMO FINAL
 # ============================================================
@@ -311,20 +337,22 @@ def construir_resumo(d):
         f"Feedback: {d.get('feedback','')}\n"
     )
 
+RESPONSAVEIS_ATENDIMENTO = [
+    {
+        "nome": "Juliano",
+        "telefone": "(11) 99373-8592",
+        "link": "https://wa.me/5511993738592"
+    },
+    {
+        "nome": "Priscila",
+        "telefone": "(11) 99408-1931",
+        "link": "https://wa.me/5511994081931"
+    }
+]
+
 def obter_responsavel_atendimento():
 
-    responsaveis = [
-        {
-            "nome": "Juliano",
-            "telefone": "(11) 99373-8592",
-            "link": "https://wa.me/5511993738592"
-        },
-        {
-            "nome": "Priscila",
-            "telefone": "(11) 99408-1931",
-            "link": "https://wa.me/5511994081931"
-        }
-    ]
+    responsaveis = list(RESPONSAVEIS_ATENDIMENTO)
 
     random.shuffle(responsaveis)
 
@@ -334,9 +362,10 @@ def obter_responsavel_atendimento():
 # MENSAGENS DE FECHAMENTO — OFICINA
 # ============================================================
 
-def construir_fechamento(dentro_horario=True):
+def construir_fechamento(dentro_horario=True, responsaveis=None):
 
-    responsaveis = obter_responsavel_atendimento()
+    if responsaveis is None:
+        responsaveis = obter_responsavel_atendimento()
 
     contatos = "\n\n".join(
         [
@@ -395,31 +424,83 @@ def construir_fechamento(dentro_horario=True):
     )
 
 # ============================================================
-def enviar_template_oficina_disparo(numero):
-    url = f"https://graph.facebook.com/v17.0/{os.getenv('WA_PHONE_NUMBER_ID')}/messages"
-
-    payload = {
-        "messaging_product": "whatsapp",
-        "recipient_type": "individual",
-        "to": numero,
-        "type": "template",
-        "template": {
-            "name": "oficina_disparo2",
-            "language": {
-                "code": "pt_BR"
-            }
-        }
-    }
+# MENSAGENS FIXAS (CATÁLOGO PRÉ-SERIALIZADO)
+# ============================================================
 
-    headers = {
-        "Authorization": f"Bearer {os.getenv('WA_ACCESS_TOKEN')}",
-        "Content-Type": "application/json"
-    }
+_OPCOES_MENU = (
+    "1 – Serviços\n"
+    "2 – Peças\n"
+    "3 – Pós-venda / Garantia\n"
+    "4 – Retorno Oficina\n"
+    "5 – Endereço e Contato"
+)
+
+_TEXTO_ENDERECO = (
+    "📍 *Endereços e Contatos Sullato*\n\n"
+    "🌐 Site: https://www.sullato.com.br\n\n"
+
+    "📍 *Sullato Micros e Vans*\n"
+    "Av. São Miguel, 7900 – CEP 08070-001\n"
+    "☎️ (11) 2030-5081 / (11) 2031-5081\n"
+    "👉 https://wa.me/5511940545704\n"
+    "👉 https://wa.me/551120305081\n"
+    "📸 Instagram: https://www.instagram.com/sullatomicrosevans\n\n"
+
+    "📍 *Sullato Veículos*\n"
+    "Av. São Miguel, 4049/4084 – CEP 03871-000\n"
+    "☎️ (11) 2542-3332 / (11) 2542-3333\n"
+    "👉 https://wa.me/5511940545704\n"
+    "👉 https://wa.me/551125423330\n"
+    "📸 Instagram: https://www.instagram.com/sullato.veiculos\n\n"
+
+    "📍 *Sullato Oficina e Peças*\n"
+    "Av. Amador Bueno da Veiga, 4222 – CEP 03652-000\n"
+    "☎️ (11) 20922304\n"
+    "👉 https://wa.me/5511994081931\n\n"
+    "🔧 *Érico*: https://wa.me/5511940497678\n"
+)
+
+catalogo_mensagens.registrar(
+    "boas_vindas",
+    f"Olá {catalogo_mensagens.campo('nome')}! 👋\n\n"
+    "Seja bem-vindo à *TS Sullato Auto Service*.\n\n"
+    "💬 Você também pode escrever sua dúvida ou enviar um áudio explicando o que precisa.\n\n"
+    "Se preferir, utilize uma das opções abaixo:\n\n"
+    f"{_OPCOES_MENU}"
+)
+catalogo_mensagens.registrar(
+    "menu_midia",
+    "Recebemos sua mensagem 👍\n\n"
+    "Você também pode enviar um áudio ou descrever sua necessidade em texto.\n\n"
+    "Escolha uma opção:\n"
+    f"{_OPCOES_MENU}"
+)
+catalogo_mensagens.registrar("menu_continuar", f"Para continuar, escolha uma opção:\n{_OPCOES_MENU}")
+catalogo_mensagens.registrar("menu_sem_ia", f"Olá! Para te atender melhor, escolha uma opção:\n{_OPCOES_MENU}")
+catalogo_mensagens.registrar("endereco", _TEXTO_ENDERECO)
+catalogo_mensagens.registrar("ajuda", "Se precisar de ajuda, estou aqui! 😊")
+catalogo_mensagens.registrar("opcao_invalida", "Escolha uma opção válida.")
+catalogo_mensagens.registrar("escolha_sim_nao", "Escolha Sim ou Não.")
+catalogo_mensagens.registrar("combustivel_invalido", "Informe um combustível válido.")
+
+# Uma variante por ordem dos responsáveis: sortear a variante equivale
+# ao shuffle que construir_fechamento() faz a cada chamada.
+_ORDENS_FECHAMENTO = list(permutations(RESPONSAVEIS_ATENDIMENTO))
+
+for _i, _ordem in enumerate(_ORDENS_FECHAMENTO):
+    catalogo_mensagens.registrar(f"fechamento_dentro_{_i}", construir_fechamento(True, list(_ordem)))
+    catalogo_mensagens.registrar(f"fechamento_fora_{_i}", construir_fechamento(False, list(_ordem)))
+
+
+def enviar_fechamento(numero, dentro_horario=True):
+    periodo = "dentro" if dentro_horario else "fora"
+    enviar_catalogo(numero, f"fechamento_{periodo}_{random.randrange(len(_ORDENS_FECHAMENTO))}")
 
-    response = requests.post(url, headers=headers, json=payload)
+# ============================================================
+def enviar_template_oficina_disparo(numero):
+    response = obter_cliente().enviar_template(numero, "oficina_disparo2")
 
-    print("📤 TEMPLATE STATUS:", response.status_code)
-    print("📤 TEMPLATE BODY:", response.text)
+    log.info("📤 TEMPLATE: %s %s", response.status_code, response.text)
 
     return response.text
 
@@ -439,25 +520,24 @@ def _enviar_alerta_handoff(numero_cliente, nome_cliente):
             f"Via: ChatBot Oficina Sullato\n\n"
             "Por favor, entre em contato!"
         )
-        payload = {
-            "messaging_product": "whatsapp",
-            "to": _HANDOFF_NUMERO,
-            "text": {"body": msg}
-        }
-        headers = {
-            "Authorization": f"Bearer {WHATSAPP_TOKEN}",
-            "Content-Type": "application/json"
-        }
-        requests.post(f"{WHATSAPP_API_URL}/messages", json=payload, headers=headers, timeout=10)
-        print("🔔 Alerta handoff Oficina enviado")
+        enviar_texto(_HANDOFF_NUMERO, msg)
+        log.info("🔔 Alerta handoff Oficina enviado")
     except Exception as e:
-        print("❌ Erro alerta handoff:", e)
+        log.error("❌ Erro alerta handoff: %s", e)
 
 # ============================================================
 # FLUXO PRINCIPAL
 # ============================================================
 
-def responder_oficina(numero, texto_digitado, nome_whatsapp):
+def responder_oficina(numero, texto_digitado, nome_whatsapp, mensagem_id=None):
+    # Um turno = uma mensagem do cliente; os envios saem juntos no final.
+    # mensagem_id (wamid recebido): se o turno rodar de novo, o que já saiu
+    # não é reenviado.
+    with caixa_saida.turno(mensagem_id):
+        return _processar_turno(numero, texto_digitado, nome_whatsapp)
+
+
+def _processar_turno(numero, texto_digitado, nome_whatsapp):
 
     texto = (texto_digitado or "").strip().lower()
 
@@ -474,33 +554,13 @@ def responder_oficina(numero, texto_digitado, nome_whatsapp):
 
         # REGISTRA IMEDIATAMENTE O ACESSO NA PLANILHA
         try:
-            payload = {
-                "secret": SECRET_KEY,
-                "route": "chatbot",
-                "dados": {
-                    "fone": numero,
-                    "nome_whatsapp": nome_whatsapp,
-                    "interesse_inicial": "acesso_inicial",
-                    "tipo_registro": "Acesso",
-                    "origem": "whatsapp"
-                }
-            }
-
-            requests.post(
-                GOOGLE_SHEETS_URL,
-                json=payload,
-                timeout=10
-            )
+            if registrar_acesso(numero, nome_whatsapp):
+                log.info("✅ ACESSO INICIAL REGISTRADO: %s - %s", numero, nome_whatsapp)
 
             sessao["acesso_registrado"] = True
 
-            print(
-                f"✅ ACESSO INICIAL REGISTRADO: "
-                f"{numero} - {nome_whatsapp}"
-            )
-
         except Exception as e:
-            print("❌ Erro registrar acesso inicial:", e)
+            log.error("❌ Erro registrar acesso inicial: %s", e)
 
         return
     
@@ -542,38 +602,12 @@ def responder_oficina(numero, texto_digitado, nome_whatsapp):
             iniciar_sessao(numero, nome_whatsapp)
 
             try:
-                payload = {
-                    "secret": SECRET_KEY,
-                    "route": "chatbot",
-                    "dados": {
-                        "fone": numero,
-                        "nome_whatsapp": nome_whatsapp,
-                        "interesse_inicial": texto,
-                        "tipo_registro": "Acesso Midia",
-                        "origem": "whatsapp"
-                    }
-                }
-
-                requests.post(
-                    GOOGLE_SHEETS_URL,
-                    json=payload,
-                    timeout=10
-                )
+                registrar_acesso(numero, nome_whatsapp, texto, "Acesso Midia")
 
             except Exception as e:
-                print("Erro registrar acesso mídia:", e)
+                log.error("Erro registrar acesso mídia: %s", e)
 
-        enviar_texto(
-            numero,
-            "Recebemos sua mensagem 👍\n\n"
-            "Você também pode enviar um áudio ou descrever sua necessidade em texto.\n\n"
-            "Escolha uma opção:\n"
-            "1 – Serviços\n"
-            "2 – Peças\n"
-            "3 – Pós-venda / Garantia\n"
-            "4 – Retorno Oficina\n"
-            "5 – Endereço e Contato"
-        )
+        enviar_catalogo(numero, "menu_midia")
 
         return
 
@@ -591,22 +625,10 @@ def responder_oficina(numero, texto_digitado, nome_whatsapp):
 
         # 🔥 REGISTRA ACESSO INICIAL
         try:
-            payload = {
-                "secret": SECRET_KEY,
-                "route": "chatbot",
-                "dados": {
-                    "fone": numero,
-                    "nome_whatsapp": nome_whatsapp,
-                    "interesse_inicial": "acesso_inicial",
-                    "tipo_registro": "Acesso",
-                    "origem": "whatsapp"
-                }
-            }
-
-            requests.post(GOOGLE_SHEETS_URL, json=payload)
+            registrar_acesso(numero, nome_whatsapp)
 
         except Exception as e:
-            print("Erro registrar acesso:", e)
+            log.error("Erro registrar acesso: %s", e)
 
         if not tem_conteudo:
             return
@@ -629,22 +651,10 @@ def responder_oficina(numero, texto_digitado, nome_whatsapp):
 
         # 🔥 REGISTRA NOVO ACESSO POR TIMEOUT
         try:
-            payload = {
-                "secret": SECRET_KEY,
-                "route": "chatbot",
-                "dados": {
-                    "fone": numero,
-                    "nome_whatsapp": nome_whatsapp,
-                    "interesse_inicial": "acesso_inicial",
-                    "tipo_registro": "Acesso",
-                    "origem": "whatsapp"
-                }
-            }
-
-            requests.post(GOOGLE_SHEETS_URL, json=payload, timeout=10)
+            registrar_acesso(numero, nome_whatsapp)
 
         except Exception as e:
-            print("Erro registrar acesso (timeout):", e)
+            log.error("Erro registrar acesso (timeout): %s", e)
 
         return
 
@@ -668,6 +678,7 @@ def responder_oficina(numero, texto_digitado, nome_whatsapp):
             resposta_ia = None
             try:
                 from responder_ia import responder_com_ia
+                caixa_saida.sinalizar_digitando()
                 hist = _get_hist_ia(numero)
                 resposta_ia = responder_com_ia(texto_digitado, nome_whatsapp, historico=hist)
             except Exception:
@@ -675,18 +686,10 @@ def responder_oficina(numero, texto_digitado, nome_whatsapp):
             if resposta_ia:
                 _add_hist_ia(numero, texto_digitado, resposta_ia)
                 enviar_texto(numero, resposta_ia)
-                enviar_texto(
-                    numero,
-                    "Para continuar, escolha uma opção:\n"
-                    "1 – Serviços\n2 – Peças\n3 – Pós-venda / Garantia\n4 – Retorno Oficina\n5 – Endereço e Contato"
-                )
+                enviar_catalogo(numero, "menu_continuar")
                 return
             else:
-                enviar_texto(
-                    numero,
-                    "Olá! Para te atender melhor, escolha uma opção:\n"
-                    "1 – Serviços\n2 – Peças\n3 – Pós-venda / Garantia\n4 – Retorno Oficina\n5 – Endereço e Contato"
-                )
+                enviar_catalogo(numero, "menu_sem_ia")
                 return
 
         if texto in ["1", "btn_servicos"]:
@@ -763,33 +766,9 @@ def responder_oficina(numero, texto_digitado, nome_whatsapp):
 
             salvar_via_webapp(sessao)
 
-            enviar_texto(
-                numero,
-                "📍 *Endereços e Contatos Sullato*\n\n"
-                "🌐 Site: https://www.sullato.com.br\n\n"
-
-                "📍 *Sullato Micros e Vans*\n"
-                "Av. São Miguel, 7900 – CEP 08070-001\n"
-                "☎️ (11) 2030-5081 / (11) 2031-5081\n"
-                "👉 https://wa.me/5511940545704\n"
-                "👉 https://wa.me/551120305081\n"
-                "📸 Instagram: https://www.instagram.com/sullatomicrosevans\n\n"
-
-                "📍 *Sullato Veículos*\n"
-                "Av. São Miguel, 4049/4084 – CEP 03871-000\n"
-                "☎️ (11) 2542-3332 / (11) 2542-3333\n"
-                "👉 https://wa.me/5511940545704\n"
-                "👉 https://wa.me/551125423330\n"
-                "📸 Instagram: https://www.instagram.com/sullato.veiculos\n\n"
-
-                "📍 *Sullato Oficina e Peças*\n"
-                "Av. Amador Bueno da Veiga, 4222 – CEP 03652-000\n"
-                "☎️ (11) 20922304\n"
-                "👉 https://wa.me/5511994081931\n\n"
-                "🔧 *Érico*: https://wa.me/5511940497678\n"
-            )
+            enviar_catalogo(numero, "endereco")
 
-            enviar_texto(numero, "Se precisar de ajuda, estou aqui! 😊")
+            enviar_catalogo(numero, "ajuda")
             reset_sessao(numero)
             return
 
@@ -902,7 +881,7 @@ def responder_oficina(numero, texto_digitado, nome_whatsapp):
         elif texto == "tv_utilitario":
             d["tipo_veiculo"] = "Utilitário"
         else:
-            enviar_texto(numero, "Escolha uma opção válida.")
+            enviar_catalogo(numero, "opcao_invalida")
             return
 
         sessao["etapa"] = "pergunta_marca_modelo"
@@ -934,7 +913,7 @@ def responder_oficina(numero, texto_digitado, nome_whatsapp):
     if etapa == "pergunta_combustivel":
         combustivel = texto.lower()
         if combustivel not in ["gasolina", "etanol", "diesel", "flex", "gnv"]:
-            enviar_texto(numero, "Informe um combustível válido.")
+            enviar_catalogo(numero, "combustivel_invalido")
             return
 
         d["combustivel"] = combustivel.title()
@@ -1010,7 +989,7 @@ def responder_oficina(numero, texto_digitado, nome_whatsapp):
                 enviar_texto(numero, "Qual foi a data do serviço realizado?")
                 return
 
-        enviar_texto(numero, "Escolha Sim ou Não.")
+        enviar_catalogo(numero, "escolha_sim_nao")
         return
 
     if etapa == "complemento_digitacao":
@@ -1249,11 +1228,7 @@ def responder_oficina(numero, texto_digitado, nome_whatsapp):
         if texto_normalizado in ["confirmar"]:
             salvar_via_webapp(sessao)
 
-            mensagem_final = construir_fechamento(
-                dentro_horario=_em_horario_oficina()
-            )
-
-            enviar_texto(numero, mensagem_final)
+            enviar_fechamento(numero, dentro_horario=_em_horario_oficina())
 
             reset_sessao(numero)  # 👈 depois do envio
 
@@ -1264,5 +1239,5 @@ def responder_oficina(numero, texto_digitado, nome_whatsapp):
             enviar_texto(numero, "Vamos corrigir. Digite seu nome completo:")
             return
 
-        enviar_texto(numero, "Escolha uma opção válida.")
+        enviar_catalogo(numero, "opcao_invalida")
         return
@@ -0,0 +1,458 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import sys
+import threading
+import time
+
+import requests
+from dotenv import load_dotenv
+
+import metricas
+from disjuntor import CircuitoAberto, obter_disjuntor
+from log_chatbot import obter_logger
+from sqlite_local import conectar, CHATBOT_DB_PATH
+
+load_dotenv()
+
+log = obter_logger("sheets")
+
+# ============================================================
+# CONFIGURAÇÃO
+# ============================================================
+
+GOOGLE_SHEETS_URL = os.getenv("OFICINA_SHEET_WEBHOOK_URL")
+SECRET_KEY = os.getenv("OFICINA_SHEETS_SECRET")
+
+SHEETS_TIMEOUT_S = float(os.getenv("SHEETS_TIMEOUT_S", "10"))
+# Um POST por lote: a cada SHEETS_LOTE_MAX linhas ou SHEETS_LOTE_S segundos
+SHEETS_LOTE_MAX = int(os.getenv("SHEETS_LOTE_MAX", "20"))
+SHEETS_LOTE_S = float(os.getenv("SHEETS_LOTE_S", "5"))
+# Rota do WebApp que recebe {"linhas": [...]} (apps_script/chatbot_lote.gs).
+# Só ligar depois de publicar a rota; vazio = uma linha por POST na rota chatbot
+SHEETS_ROTA_LOTE = os.getenv("SHEETS_ROTA_LOTE", "")
+# Nova tentativa de linha que falhou: base * 2^tentativas, até o teto
+SHEETS_BACKOFF_BASE_S = float(os.getenv("SHEETS_BACKOFF_BASE_S", "5"))
+SHEETS_BACKOFF_MAX_S = float(os.getenv("SHEETS_BACKOFF_MAX_S", "900"))
+# Depois de tantas tentativas a linha fica como "falhou" (não sai mais
+# sozinha; ver "python sheets_webapp.py pendentes" e "reenviar")
+SHEETS_MAX_TENTATIVAS = int(os.getenv("SHEETS_MAX_TENTATIVAS", "10"))
+# Como a rota "chatbot" confirma a gravação: "http" = qualquer 2xx (o que o
+# WebApp atual garante); "ok" = só com {"ok": true} no corpo. Nos dois casos
+# {"ok": false} é recusa. A rota de lote sempre usa "resultados".
+SHEETS_CONFIRMACAO = os.getenv("SHEETS_CONFIRMACAO", "http")
+# Linha "enviando" há mais que isso (processo caiu no meio) volta a ser pendente.
+# A reserva é renovada antes de cada POST, então só precisa cobrir um POST.
+SHEETS_RESERVA_S = max(float(os.getenv("SHEETS_RESERVA_S", "120")), 3 * SHEETS_TIMEOUT_S)
+# Linhas já enviadas ficam no outbox por este tempo (conferência)
+SHEETS_OUTBOX_RETER_S = int(os.getenv("SHEETS_OUTBOX_RETER_S", str(7 * 24 * 3600)))
+
+_DISJUNTOR = obter_disjuntor("apps_script")
+_SESSAO = requests.Session()
+
+# ============================================================
+# CHAMADA AO APPS SCRIPT (WEBAPP DA PLANILHA)
+# ============================================================
+
+def _post(payload):
+    r = _SESSAO.post(GOOGLE_SHEETS_URL, json=payload, timeout=SHEETS_TIMEOUT_S)
+    # Qualquer resposta fora de 2xx (rota errada, secret recusado, 5xx) é falha:
+    # a linha continua no outbox
+    if not 200 <= r.status_code < 300:
+        raise requests.HTTPError(f"Apps Script respondeu {r.status_code}", response=r)
+    return r
+
+
+def postar(rota, **campos):
+    """POST no Apps Script pelo disjuntor. Levanta CircuitoAberto ou o erro de rede."""
+    if not GOOGLE_SHEETS_URL:
+        raise RuntimeError("OFICINA_SHEET_WEBHOOK_URL não configurada")
+
+    payload = {"secret": SECRET_KEY, "route": rota}
+    payload.update(campos)
+    return _DISJUNTOR.chamar(_post, payload)
+
+# ============================================================
+# OUTBOX DA PLANILHA (SQLITE, SOBREVIVE A QUEDA DO PROCESSO)
+# ============================================================
+# Cada linha é gravada aqui antes de registrar() voltar. O envio em lote
+# marca as linhas como enviadas; falha agenda nova tentativa com backoff.
+# Linhas que estavam "enviando" quando o processo caiu voltam a ser
+# pendentes depois de SHEETS_RESERVA_S sem renovação.
+
+class OutboxPlanilha:
+
+    def __init__(self, caminho=CHATBOT_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = conectar(caminho)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sheets_outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " dados TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " tentativas INTEGER NOT NULL DEFAULT 0,"
+            " erro TEXT,"
+            " proximo_em REAL NOT NULL DEFAULT 0,"
+            " criado_em REAL NOT NULL,"
+            " atualizado_em REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS sheets_outbox_status ON sheets_outbox (status, proximo_em)"
+        )
+
+    def criar(self, dados):
+        agora = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO sheets_outbox (dados, status, criado_em, atualizado_em) "
+                "VALUES (?, 'pendente', ?, ?)",
+                (json.dumps(dados, ensure_ascii=False), agora, agora),
+            )
+            return cur.lastrowid
+
+    def reservar(self, limite):
+        """Reserva até `limite` linhas vencidas, na ordem em que foram criadas."""
+        agora = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE: dois workers do gunicorn não pegam a mesma linha
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                linhas = self._conn.execute(
+                    "SELECT id, dados FROM sheets_outbox "
+                    "WHERE (status = 'pendente' AND proximo_em <= ?) "
+                    "   OR (status = 'enviando' AND atualizado_em <= ?) "
+                    "ORDER BY id LIMIT ?",
+                    (agora, agora - SHEETS_RESERVA_S, limite),
+                ).fetchall()
+                if linhas:
+                    self._conn.executemany(
+                        "UPDATE sheets_outbox SET status = 'enviando', atualizado_em = ? WHERE id = ?",
+                        [(agora, linha[0]) for linha in linhas],
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        return [(linha_id, json.loads(dados)) for linha_id, dados in linhas]
+
+    def renovar(self, ids):
+        # Envio linha a linha: o lote todo continua reservado enquanto sai
+        agora = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE sheets_outbox SET atualizado_em = ? WHERE id = ? AND status = 'enviando'",
+                [(agora, linha_id) for linha_id in ids],
+            )
+
+    def marcar_enviadas(self, ids):
+        agora = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE sheets_outbox SET status = 'enviado', erro = NULL, "
+                "tentativas = tentativas + 1, atualizado_em = ? WHERE id = ?",
+                [(agora, linha_id) for linha_id in ids],
+            )
+
+    def liberar(self, ids):
+        # Linhas reservadas que nem chegaram a sair: voltam sem contar tentativa
+        agora = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE sheets_outbox SET status = 'pendente', atualizado_em = ? "
+                "WHERE id = ? AND status = 'enviando'",
+                [(agora, linha_id) for linha_id in ids],
+            )
+
+    def marcar_falha(self, ids, erro):
+        """Agenda nova tentativa; devolve quantas linhas esgotaram as tentativas."""
+        agora = time.time()
+        with self._lock:
+            # Backoff exponencial por linha: base * 2^tentativas, até o teto.
+            # Na última tentativa a linha vira "falhou" e para de sair.
+            self._conn.executemany(
+                "UPDATE sheets_outbox SET "
+                "status = CASE WHEN tentativas + 1 >= ? THEN 'falhou' ELSE 'pendente' END, "
+                "tentativas = tentativas + 1, erro = ?, "
+                "proximo_em = ? + MIN(?, ? * (1 << MIN(tentativas, 16))), atualizado_em = ? WHERE id = ?",
+                [
+                    (SHEETS_MAX_TENTATIVAS, str(erro)[:500], agora, SHEETS_BACKOFF_MAX_S,
+                     SHEETS_BACKOFF_BASE_S, agora, linha_id)
+                    for linha_id in ids
+                ],
+            )
+            marcas = ",".join("?" * len(ids))
+            return self._conn.execute(
+                f"SELECT COUNT(*) FROM sheets_outbox WHERE status = 'falhou' AND id IN ({marcas})",
+                list(ids),
+            ).fetchone()[0]
+
+    def antecipar(self):
+        # Reconciliação manual: tudo que está pendente (ou já desistiu) sai agora
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE sheets_outbox SET proximo_em = 0, "
+                "tentativas = CASE WHEN status = 'falhou' THEN 0 ELSE tentativas END, "
+                "status = 'pendente' WHERE status IN ('pendente', 'falhou')"
+            ).rowcount
+
+    def limpar_enviadas(self, antes_de):
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM sheets_outbox WHERE status = 'enviado' AND atualizado_em < ?", (antes_de,)
+            ).rowcount
+
+    def contagem_por_status(self):
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM sheets_outbox GROUP BY status"
+            ).fetchall())
+
+    def nao_enviadas(self, limite=50):
+        with self._lock:
+            linhas = self._conn.execute(
+                "SELECT id, status, tentativas, erro, proximo_em, criado_em, dados FROM sheets_outbox "
+                "WHERE status != 'enviado' ORDER BY id LIMIT ?",
+                (limite,),
+            ).fetchall()
+        campos = ("id", "status", "tentativas", "erro", "proximo_em", "criado_em", "dados")
+        return [dict(zip(campos, linha)) for linha in linhas]
+
+# ============================================================
+# ENVIO EM LOTE (WRITE-BEHIND)
+# ============================================================
+# registrar() grava a linha no outbox e volta: a conversa nunca espera o
+# Google. Uma thread junta as linhas e manda um POST por lote
+# (SHEETS_LOTE_MAX linhas ou SHEETS_LOTE_S segundos, o que vier antes) na
+# rota SHEETS_ROTA_LOTE.
+
+_OUTBOX = None
+_LOCK = threading.Lock()
+_CONDICAO = threading.Condition()
+_NOVAS = 0
+_DESCARREGADOR = None
+
+
+def _outbox():
+    global _OUTBOX
+
+    if _OUTBOX is None:
+        with _LOCK:
+            if _OUTBOX is None:
+                _OUTBOX = OutboxPlanilha()
+                metricas.registrar_gauge("sheets_outbox", _OUTBOX.contagem_por_status)
+    return _OUTBOX
+
+
+def _iniciar_descarregador():
+    global _DESCARREGADOR
+
+    with _LOCK:
+        if _DESCARREGADOR is None:
+            _DESCARREGADOR = threading.Thread(
+                target=_descarregar_continuamente, name="sheets-lote", daemon=True
+            )
+            _DESCARREGADOR.start()
+
+
+def _posicoes_recusadas(resposta, lote):
+    # O WebApp devolve {"ok": true, "resultados": [{"ok": true}, ...]} na ordem
+    # do lote. Resposta fora desse formato: nenhuma linha é dada como gravada.
+    todas = list(range(len(lote)))
+    try:
+        corpo = resposta.json()
+    except ValueError:
+        return todas
+    if not isinstance(corpo, dict) or corpo.get("ok") is False:
+        return todas
+
+    resultados = corpo.get("resultados")
+    if not isinstance(resultados, list) or len(resultados) != len(lote):
+        return todas
+    return [pos for pos, res in enumerate(resultados) if not (isinstance(res, dict) and res.get("ok") is True)]
+
+
+def _linha_aceita(resposta):
+    # Rota "chatbot": 2xx já passou por _post; {"ok": false} é sempre recusa
+    try:
+        corpo = resposta.json()
+    except ValueError:
+        corpo = None
+    if isinstance(corpo, dict) and corpo.get("ok") is False:
+        return False
+    if SHEETS_CONFIRMACAO == "ok":
+        return isinstance(corpo, dict) and corpo.get("ok") is True
+    return True
+
+
+def _enviar_lote(lote, renovar=None):
+    """Envia as linhas; devolve (recusadas, nao_enviadas, falha).
+
+    Na rota linha a linha, uma exceção para o lote: falha = (posição, erro)
+    da linha em que estourou, e as seguintes voltam ao outbox sem penalidade.
+    `renovar()` é chamado antes de cada POST dessa rota: o lote inteiro
+    (inclusive o que já saiu) só é marcado no fim.
+    """
+    inicio = time.perf_counter()
+
+    recusadas, nao_enviadas, falha = [], [], None
+    if SHEETS_ROTA_LOTE:
+        r = postar(SHEETS_ROTA_LOTE, linhas=lote)
+        recusadas = _posicoes_recusadas(r, lote)
+    else:
+        # WebApp sem rota de lote: uma linha por POST, ainda fora da conversa
+        for pos, dados in enumerate(lote):
+            if renovar and pos:
+                renovar()
+            try:
+                aceita = _linha_aceita(postar("chatbot", dados=dados))
+            except CircuitoAberto:
+                # Disjuntor aberto: esta linha também não chegou a sair
+                nao_enviadas = list(range(pos, len(lote)))
+                break
+            except Exception as e:
+                falha = (pos, e)
+                nao_enviadas = list(range(pos + 1, len(lote)))
+                break
+            if not aceita:
+                recusadas.append(pos)
+
+    metricas.observar("sheets_lote_ms", (time.perf_counter() - inicio) * 1000)
+    return recusadas, nao_enviadas, falha
+
+
+def _falhar(outbox, ids, erro):
+    esgotadas = outbox.marcar_falha(ids, erro)
+    metricas.incrementar("sheets_linhas_reagendadas", len(ids) - esgotadas)
+    if esgotadas:
+        metricas.incrementar("sheets_linhas_falhou", esgotadas)
+        log.error(
+            "❌ %s linhas da planilha desistiram após %s tentativas (ver sheets_webapp.py pendentes): %s",
+            esgotadas, SHEETS_MAX_TENTATIVAS, erro,
+        )
+
+
+def _descarregar_lote():
+    """Reserva e envia um lote. Devolve False quando não há mais o que enviar agora."""
+    outbox = _outbox()
+    reservadas = outbox.reservar(SHEETS_LOTE_MAX)
+    if not reservadas:
+        return False
+
+    ids = [linha_id for linha_id, _ in reservadas]
+    lote = [dados for _, dados in reservadas]
+
+    try:
+        recusadas, nao_enviadas, falha = _enviar_lote(lote, lambda: outbox.renovar(ids))
+    except Exception as e:
+        log.warning("⚠️ Planilha indisponível, %s linhas ficam no outbox: %s", len(lote), e)
+        _falhar(outbox, ids, e)
+        return False
+
+    ids_recusados = [ids[pos] for pos in recusadas]
+    ids_nao_enviados = [ids[pos] for pos in nao_enviadas]
+    ids_falha = [ids[falha[0]]] if falha else []
+    sobraram = set(ids_recusados) | set(ids_nao_enviados) | set(ids_falha)
+    enviados = [linha_id for linha_id in ids if linha_id not in sobraram]
+    outbox.marcar_enviadas(enviados)
+
+    metricas.incrementar("sheets_lotes_enviados")
+    metricas.incrementar("sheets_linhas_enviadas", len(enviados))
+    metricas.observar("sheets_lote_tamanho", len(lote))
+
+    if ids_recusados:
+        log.warning("⚠️ Planilha recusou %s de %s linhas do lote", len(ids_recusados), len(lote))
+        _falhar(outbox, ids_recusados, "recusada pelo WebApp")
+    if ids_falha:
+        log.warning("⚠️ Planilha indisponível no meio do lote: %s", falha[1])
+        _falhar(outbox, ids_falha, falha[1])
+    if ids_nao_enviados:
+        # Não chegaram a sair: voltam ao outbox sem contar tentativa
+        outbox.liberar(ids_nao_enviados)
+
+    return not sobraram
+
+
+def _descarregar_continuamente():
+    global _NOVAS
+
+    proxima_limpeza = 0.0
+    while True:
+        with _CONDICAO:
+            if _NOVAS < SHEETS_LOTE_MAX:
+                _CONDICAO.wait(timeout=SHEETS_LOTE_S)
+            _NOVAS = 0
+
+        try:
+            while _descarregar_lote():
+                pass
+
+            if time.time() >= proxima_limpeza:
+                _outbox().limpar_enviadas(time.time() - SHEETS_OUTBOX_RETER_S)
+                proxima_limpeza = time.time() + 3600
+        except Exception as e:
+            log.exception("❌ Erro no envio em lote da planilha: %s", e)
+
+
+def registrar(dados):
+    """Grava a linha no outbox local e volta na hora (envio em lote, em background)."""
+    global _NOVAS
+
+    if not GOOGLE_SHEETS_URL:
+        log.warning("⚠️ OFICINA_SHEET_WEBHOOK_URL não configurada, linha ignorada")
+        return False
+
+    _outbox().criar(dados)
+    metricas.incrementar("sheets_linhas_recebidas")
+    _iniciar_descarregador()
+
+    with _CONDICAO:
+        _NOVAS += 1
+        if _NOVAS >= SHEETS_LOTE_MAX:
+            _CONDICAO.notify()
+    return True
+
+
+def retomar():
+    """Na subida do processo: volta a enviar o que ficou no outbox."""
+    if not GOOGLE_SHEETS_URL:
+        return 0
+
+    contagem = _outbox().contagem_por_status()
+    nao_enviadas = sum(qtd for status, qtd in contagem.items() if status != "enviado")
+    if nao_enviadas:
+        log.info("📤 %s linhas da planilha no outbox, retomando envio", nao_enviadas)
+        _iniciar_descarregador()
+    return nao_enviadas
+
+
+def pendentes():
+    contagem = _outbox().contagem_por_status()
+    return sum(qtd for status, qtd in contagem.items() if status != "enviado")
+
+# ============================================================
+# LINHA DE COMANDO (RECONCILIAÇÃO)
+# ============================================================
+# python sheets_webapp.py status            -> contagem por status
+# python sheets_webapp.py pendentes [N]     -> linhas ainda não enviadas
+# python sheets_webapp.py reenviar          -> envia agora tudo que está pendente ou "falhou"
+
+if __name__ == "__main__":
+    comando = sys.argv[1] if len(sys.argv) > 1 else "status"
+
+    if comando == "status":
+        print(json.dumps(_outbox().contagem_por_status(), ensure_ascii=False))
+
+    elif comando == "pendentes":
+        limite = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+        for linha in _outbox().nao_enviadas(limite):
+            print(json.dumps(linha, ensure_ascii=False))
+
+    elif comando == "reenviar":
+        print(f"{_outbox().antecipar()} linhas antecipadas")
+        while _descarregar_lote():
+            pass
+        print(json.dumps(_outbox().contagem_por_status(), ensure_ascii=False))
+
+    else:
+        print("Uso: python sheets_webapp.py status | pendentes [N] | reenviar")
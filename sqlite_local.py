@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+import os
+import sqlite3
+
+# Banco local padrão (envios, campanhas, outbox da planilha...)
+CHATBOT_DB_PATH = os.getenv("CHATBOT_DB_PATH", "dados/chatbot.db")
+
+# ============================================================
+# CONEXÃO SQLITE COMPARTILHADA ENTRE THREADS/PROCESSOS
+# ============================================================
+
+def conectar(caminho):
+    pasta = os.path.dirname(os.path.abspath(caminho))
+    os.makedirs(pasta, exist_ok=True)
+
+    # check_same_thread=False: quem usa a conexão protege com um Lock próprio.
+    # WAL + busy_timeout deixam vários workers do gunicorn no mesmo arquivo.
+    conn = sqlite3.connect(caminho, timeout=5, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
@@ -1,50 +1,65 @@
 import os
-import requests
 import tempfile
 
+from disjuntor import obter_disjuntor
+from log_chatbot import obter_logger
+from whatsapp_client import obter_cliente
+
+log = obter_logger("audio")
+
+GROQ_TIMEOUT_S = float(os.getenv("GROQ_TIMEOUT_S", "20"))
+
+# Groq fora do ar: devolve "" e o áudio cai na resposta padrão (__audio__)
+_DISJUNTOR = obter_disjuntor("groq")
+
 def transcrever_audio(media_id: str, access_token: str) -> str:
     groq_key = os.getenv("GROQ_API_KEY", "").strip()
     if not groq_key:
-        print("⚠️ GROQ_API_KEY nao configurada")
+        log.warning("⚠️ GROQ_API_KEY nao configurada")
         return ""
 
     try:
-        # 1. Obter URL do arquivo na Meta
-        headers = {"Authorization": f"Bearer {access_token}"}
-        r = requests.get(f"https://graph.facebook.com/v20.0/{media_id}", headers=headers, timeout=10)
-        if r.status_code != 200:
-            print("⚠️ Erro ao obter info do audio:", r.text)
-            return ""
-        media_url = r.json().get("url", "")
+        # 1. Obter URL do arquivo na Meta (access_token mantido por compatibilidade;
+        #    o cliente compartilhado já carrega o token)
+        cliente = obter_cliente()
+        media_url = cliente.obter_url_midia(media_id)
         if not media_url:
             return ""
 
         # 2. Baixar o arquivo de audio
-        r2 = requests.get(media_url, headers=headers, timeout=30)
-        if r2.status_code != 200:
-            print("⚠️ Erro ao baixar audio:", r2.status_code)
+        conteudo = cliente.baixar_midia(media_url)
+        if not conteudo:
             return ""
 
         # 3. Transcrever via Groq Whisper
+        if not _DISJUNTOR.permitir():
+            return ""
+
         with tempfile.NamedTemporaryFile(suffix=".ogg", delete=False) as tmp:
-            tmp.write(r2.content)
+            tmp.write(conteudo)
             tmp_path = tmp.name
 
-        from groq import Groq
-        client = Groq(api_key=groq_key)
-        with open(tmp_path, "rb") as audio_file:
-            resultado = client.audio.transcriptions.create(
-                model="whisper-large-v3-turbo",
-                file=audio_file,
-                language="pt",
-                response_format="text"
-            )
-
-        os.unlink(tmp_path)
+        try:
+            from groq import Groq
+            client = Groq(api_key=groq_key, timeout=GROQ_TIMEOUT_S)
+            with open(tmp_path, "rb") as audio_file:
+                resultado = client.audio.transcriptions.create(
+                    model="whisper-large-v3-turbo",
+                    file=audio_file,
+                    language="pt",
+                    response_format="text"
+                )
+        except Exception:
+            _DISJUNTOR.falha()
+            raise
+        finally:
+            os.unlink(tmp_path)
+
+        _DISJUNTOR.sucesso()
         texto = (resultado or "").strip()
-        print(f"🎙️ Transcricao: {texto!r}")
+        log.info("🎙️ Transcricao: %r", texto)
         return texto
 
     except Exception as e:
-        print("❌ Erro na transcricao de audio:", e)
+        log.error("❌ Erro na transcricao de audio: %s", e)
         return ""
@@ -1,15 +1,32 @@
+import hmac
+import itertools
 import os
 import requests
-from flask import Flask, request
+from flask import Flask, request, jsonify
 from dotenv import load_dotenv
 from responder_oficina import responder_oficina
+from fila_webhook import enfileirar, enfileirar_lote
+import metricas
+from log_chatbot import obter_logger, amostrar_payload
+from dedup import DedupMensagens, DEDUP_SQLITE_PATH
+from mensagem_entrada import decodificar, extrair_mensagens, extrair_status, eh_somente_status, contar_status
+import fila_envio
+import disparo_campanha
+import caixa_saida
+import disjuntor
+import sheets_webapp
 
 load_dotenv()
 
 app = Flask(__name__)
 
-# 🔒 CONTROLE DE DUPLICIDADE (MEMÓRIA TEMPORÁRIA)
-MENSAGENS_PROCESSADAS = set()
+log = obter_logger("webhook")
+
+# 🔒 CONTROLE DE DUPLICIDADE (JANELA DE TEMPO + LIMITE DE MEMÓRIA)
+MENSAGENS_PROCESSADAS = DedupMensagens(
+    nome="dedup_mensagens",
+    caminho_sqlite=DEDUP_SQLITE_PATH or None,
+)
 
 # ============================================================
 # VARIÁVEIS DE AMBIENTE
@@ -19,6 +36,7 @@ WA_PHONE_NUMBER_ID = os.getenv("WA_PHONE_NUMBER_ID")
 WA_ACCESS_TOKEN = os.getenv("WA_ACCESS_TOKEN")
 WEBAPP_URL = os.getenv("WEBAPP_URL")
 OFICINA_SHEETS_SECRET = os.getenv("OFICINA_SHEETS_SECRET")
+GOOGLE_SHEETS_CONFIGURADO = bool(os.getenv("OFICINA_SHEET_WEBHOOK_URL"))
 
 # ============================================================
 # HOME
@@ -48,6 +66,93 @@ def verify():
         return request.args.get("hub.challenge"), 200
     return "Erro", 403
 
+# ============================================================
+# MÉTRICAS
+# ============================================================
+@app.route("/metricas", methods=["GET"])
+def ver_metricas():
+    return jsonify(metricas.instantaneo()), 200
+
+# ============================================================
+# ESTADO DOS DISJUNTORES (GRAPH, APPS SCRIPT, VIACEP, CLAUDE, GROQ)
+# ============================================================
+@app.route("/disjuntores", methods=["GET"])
+def ver_disjuntores():
+    return jsonify(disjuntor.estados()), 200
+
+# ============================================================
+# RASTREIO DE ENVIO (WAMID -> STATUS)
+# ============================================================
+@app.route("/envios/<wamid>", methods=["GET"])
+def ver_envio(wamid):
+    envio = fila_envio.consultar(wamid)
+    if envio is None:
+        return jsonify({"erro": "envio não encontrado"}), 404
+    return jsonify(envio), 200
+
+# ============================================================
+# CAMPANHAS (DISPARO EM MASSA DO TEMPLATE)
+# ============================================================
+def _autorizado(dados):
+    # Sem secret configurado as rotas de disparo ficam fechadas
+    if not OFICINA_SHEETS_SECRET:
+        log.warning("⚠️ OFICINA_SHEETS_SECRET não configurado: disparo recusado")
+        return False
+    segredo = request.headers.get("X-Secret") or dados.get("secret") or ""
+    return hmac.compare_digest(str(segredo), OFICINA_SHEETS_SECRET)
+
+
+@app.route("/campanhas", methods=["POST"])
+def criar_campanha():
+    arquivo = request.files.get("arquivo")
+    dados = request.form.to_dict() if arquivo else (request.get_json(silent=True) or {})
+
+    if not _autorizado(dados):
+        return jsonify({"erro": "não autorizado"}), 403
+
+    if arquivo:
+        numeros = disparo_campanha.ler_numeros(arquivo.read().decode("utf-8", errors="replace"))
+    elif isinstance(dados.get("numeros"), list):
+        numeros = disparo_campanha.ler_numeros("\n".join(map(str, dados["numeros"])))
+    elif dados.get("origem") == "mala_direta":
+        try:
+            numeros = disparo_campanha.carregar_mala_direta()
+        except FileNotFoundError:
+            return jsonify({"erro": f"{disparo_campanha.ARQUIVO_MALA_DIRETA} não encontrado"}), 400
+    else:
+        return jsonify({"erro": "envie 'arquivo', 'numeros' ou origem=mala_direta"}), 400
+
+    if not numeros:
+        return jsonify({"erro": "nenhum número válido"}), 400
+
+    campanha_id = disparo_campanha.criar_campanha(
+        numeros,
+        normalizar_dropbox(dados.get("imagem_url")),
+        dados.get("template") or disparo_campanha.CAMPANHA_TEMPLATE,
+    )
+    return jsonify({"campanha": campanha_id, "total": len(numeros)}), 202
+
+
+@app.route("/campanhas/<campanha_id>", methods=["GET"])
+def ver_campanha(campanha_id):
+    resumo = disparo_campanha.status_campanha(campanha_id)
+    if resumo is None:
+        return jsonify({"erro": "campanha não encontrada"}), 404
+    return jsonify(resumo), 200
+
+# ============================================================
+# CACHE DA IMAGEM DO MÊS
+# ============================================================
+@app.route("/cache/imagem-mes/invalidar", methods=["POST"])
+def invalidar_cache_imagem_mes():
+    dados = request.get_json(silent=True) or {}
+    if not _autorizado(dados):
+        return jsonify({"erro": "não autorizado"}), 403
+
+    from responder_oficina import invalidar_imagem_oficina_mes
+    invalidar_imagem_oficina_mes()
+    return jsonify({"ok": True}), 200
+
 # ============================================================
 # NORMALIZA DROPBOX
 # ============================================================
@@ -64,7 +169,7 @@ def normalizar_dropbox(url):
 # ============================================================
 def registrar_acesso_inicial(numero, nome):
     if not WEBAPP_URL or not OFICINA_SHEETS_SECRET:
-        print("⚠️ WEBAPP_URL ou OFICINA_SHEETS_SECRET não configurado.")
+        log.warning("⚠️ WEBAPP_URL ou OFICINA_SHEETS_SECRET não configurado.")
         return
 
     try:
@@ -81,178 +186,197 @@ def registrar_acesso_inicial(numero, nome):
         }
 
         r = requests.post(WEBAPP_URL, json=payload, timeout=10)
-        print("📝 ACESSO REGISTRADO:", r.status_code)
+        log.info("📝 ACESSO REGISTRADO: %s", r.status_code)
 
     except Exception as e:
-        print("❌ ERRO REGISTRAR ACESSO:", e)
+        log.error("❌ ERRO REGISTRAR ACESSO: %s", e)
 
 # ============================================================
 # ENVIO TEMPLATE
 # ============================================================
 def enviar_template_oficina(numero, imagem_url):
-    url = f"https://graph.facebook.com/v20.0/{WA_PHONE_NUMBER_ID}/messages"
-
-    payload = {
-        "messaging_product": "whatsapp",
-        "to": numero,
-        "type": "template",
-        "template": {
-            "name": "oficina_disparo2",
-            "language": {"code": "pt_BR"},
-            "components": [
-                {
-                    "type": "header",
-                    "parameters": [
-                        {
-                            "type": "image",
-                            "image": {"link": imagem_url}
-                        }
-                    ]
-                }
-            ]
-        }
-    }
-
-    headers = {
-        "Authorization": f"Bearer {WA_ACCESS_TOKEN}",
-        "Content-Type": "application/json"
-    }
-
-    r = requests.post(url, json=payload, headers=headers, timeout=30)
-    print("📤 TEMPLATE:", r.status_code, r.text)
+    r = disparo_campanha.enviar_template_campanha(numero, imagem_url, "oficina_disparo2")
+    log.info("📤 TEMPLATE: %s %s", r.status_code, r.text)
 
 # ============================================================
-# WEBHOOK POST
+# PROCESSAMENTO DA MENSAGEM (WORKER)
 # ============================================================
-@app.route("/webhook", methods=["POST"])
-def webhook():
+def processar_mensagem(mensagem):
 
-    try:
-        data = request.get_json(force=True)
-    except:
-        data = {}
+    numero = mensagem.wa_id
+    texto = mensagem.text
+    tipo_msg = mensagem.type
 
-    print("📩 PAYLOAD RECEBIDO:")
-    print(data)
+    # BOTÃO TEMPLATE
+    if tipo_msg == "button" and texto and texto.lower() in ["olá", "ola"]:
+        from responder_oficina import reset_sessao
+        reset_sessao(numero)
 
-    # ===== DISPARO APPS SCRIPT =====
-    if data.get("origem") == "apps_script_disparo" or data.get("tipo") == "apps_script_disparo":
+    # ÁUDIO: transcreve via Groq Whisper
+    elif tipo_msg == "audio" and mensagem.media_id:
+        try:
+            from transcrever_audio import transcrever_audio
 
-        numero = data.get("numero")
-        imagem = normalizar_dropbox(data.get("imagem_url"))
+            # "lida + digitando..." sai em paralelo enquanto o Groq transcreve
+            caixa_saida.sinalizar_digitando(mensagem.id)
+            texto = transcrever_audio(mensagem.media_id, WA_ACCESS_TOKEN)
+            log.info("🎙️ Áudio transcrito: %r", texto)
 
-        if numero and imagem:
-            enviar_template_oficina(numero, imagem)
-            print("🚀 DISPARO EXECUTADO")
-            return "OK", 200
-        else:
-            return "ERRO", 400
-
-    # ===== EVENTOS META =====
-    if "entry" not in data:
-        return "OK", 200
+        except Exception as e:
+            log.error("❌ Erro ao transcrever áudio: %s", e)
 
-    for entry in data["entry"]:
-        for change in entry.get("changes", []):
-            value = change.get("value", {})
-            messages = value.get("messages")
-            contacts = value.get("contacts")
+    # ============================================================
+    # GARANTE TEXTO PADRÃO PARA MÍDIAS
+    # ============================================================
 
-            if not messages or not contacts:
-                continue
+    if not texto or len(str(texto).strip()) == 0:
 
-            msg = messages[0]
+        if tipo_msg == "audio":
+            texto = "__audio__"
 
-            if "from" not in msg:
-                continue
+        elif tipo_msg == "image":
+            texto = "__imagem__"
 
-            message_id = msg.get("id")
+        elif tipo_msg == "video":
+            texto = "__video__"
 
-            if message_id in MENSAGENS_PROCESSADAS:
-                continue
+        elif tipo_msg == "document":
+            texto = "__documento__"
 
-            MENSAGENS_PROCESSADAS.add(message_id)
+        else:
+            texto = "__mensagem__"
 
-            numero = contacts[0].get("wa_id")
+    log.info(
+        "👉 RECEBIDO",
+        extra={"dados": {"id": mensagem.id, "numero": numero, "tipo": tipo_msg, "texto": texto}},
+    )
 
-            if msg.get("from") != numero:
-                continue
+    responder_oficina(
+        numero=numero,
+        texto_digitado=texto,
+        nome_whatsapp=mensagem.name,
+        mensagem_id=mensagem.id,
+    )
 
-            nome = contacts[0].get("profile", {}).get("name", "Cliente")
+# ============================================================
+# RECIBOS DE ENVIO (WORKER)
+# ============================================================
+# Recibos não usam a chave do número: não esperam o turno do cliente, e
+# aplicar_status já ignora status que chegam fora de ordem.
+_SEQ_STATUS = itertools.count()
 
-            texto = ""
 
-            # TEXTO NORMAL
-            if msg.get("type") == "text":
-                texto = msg.get("text", {}).get("body", "").strip()
+def registrar_status_corpo(corpo):
+    # Corpo só de recibos: decodificado aqui, depois do 200 para a Meta
+    try:
+        data = decodificar(corpo)
+    except Exception:
+        return
+    if isinstance(data, dict):
+        fila_envio.registrar_status(extrair_status(data))
 
-            # INTERACTIVE
-            elif msg.get("type") == "interactive":
-                interactive = msg.get("interactive", {})
-                tipo = interactive.get("type")
 
-                if tipo == "button_reply":
-                    texto = interactive["button_reply"].get("id") or interactive["button_reply"].get("title")
+def enfileirar_status(statuses):
+    # Um recibo por chave (wamid): recibos de mensagens diferentes em paralelo
+    for status in statuses:
+        enfileirar(f"status:{status.get('id', '')}", fila_envio.registrar_status, [status])
 
-                elif tipo == "list_reply":
-                    texto = interactive["list_reply"].get("id") or interactive["list_reply"].get("title")
+# ============================================================
+# WEBHOOK POST
+# ============================================================
+@app.route("/webhook", methods=["POST"])
+def webhook():
 
-            # BOTÃO TEMPLATE
-            elif msg.get("type") == "button":
-                texto = msg.get("button", {}).get("text")
+    corpo = request.get_data()
 
-                if texto and texto.lower() in ["olá", "ola"]:
-                    from responder_oficina import reset_sessao
-                    reset_sessao(numero)
+    # ===== FAST PATH: SÓ RECIBOS (sent/delivered/read/failed) =====
+    if eh_somente_status(corpo):
+        metricas.incrementar("webhook_somente_status")
+        for status, qtd in contar_status(corpo).items():
+            metricas.incrementar(f"webhook_status_{status}", qtd)
 
-            # ÁUDIO: transcreve via Groq Whisper
-            elif msg.get("type") == "audio":
-                try:
-                    from transcrever_audio import transcrever_audio
+        # Casa os recibos com os envios rastreados, fora da requisição
+        if fila_envio.ENVIO_ASSINCRONO:
+            enfileirar(f"status-corpo:{next(_SEQ_STATUS)}", registrar_status_corpo, corpo)
 
-                    media_id = (msg.get("audio") or {}).get("id", "")
+        return "OK", 200
 
-                    if media_id:
-                        texto = transcrever_audio(media_id, WA_ACCESS_TOKEN)
-                        print(f"🎙️ Áudio transcrito: {texto!r}")
+    try:
+        data = decodificar(corpo)
+    except Exception:
+        data = {}
 
-                except Exception as e:
-                    print("❌ Erro ao transcrever áudio:", e)
+    if not isinstance(data, dict):
+        data = {}
 
-            # ============================================================
-            # GARANTE TEXTO PADRÃO PARA MÍDIAS
-            # ============================================================
+    amostrar_payload(log, corpo)
 
-            tipo_msg = msg.get("type", "desconhecido")
+    # ===== DISPARO APPS SCRIPT =====
+    if data.get("origem") == "apps_script_disparo" or data.get("tipo") == "apps_script_disparo":
 
-            if not texto or len(str(texto).strip()) == 0:
+        numero = data.get("numero")
+        imagem = normalizar_dropbox(data.get("imagem_url"))
 
-                if tipo_msg == "audio":
-                    texto = "__audio__"
+        # Lista inteira de uma vez: vira campanha em background
+        if isinstance(data.get("numeros"), list) and imagem:
+            if not _autorizado(data):
+                return jsonify({"erro": "não autorizado"}), 403
+            numeros = disparo_campanha.ler_numeros("\n".join(map(str, data["numeros"])))
+            campanha_id = disparo_campanha.criar_campanha(numeros, imagem)
+            return jsonify({"campanha": campanha_id, "total": len(numeros)}), 202
 
-                elif tipo_msg == "image":
-                    texto = "__imagem__"
+        if numero and imagem:
+            enviar_template_oficina(numero, imagem)
+            log.info("🚀 DISPARO EXECUTADO", extra={"dados": {"numero": numero}})
+            return "OK", 200
+        else:
+            return "ERRO", 400
 
-                elif tipo_msg == "video":
-                    texto = "__video__"
+    # ===== EVENTOS META =====
+    if "entry" not in data:
+        return "OK", 200
 
-                elif tipo_msg == "document":
-                    texto = "__documento__"
+    mensagens, total_changes = extrair_mensagens(data, dedup=MENSAGENS_PROCESSADAS)
 
-                else:
-                    texto = "__mensagem__"
+    statuses = extrair_status(data)
+    if statuses and fila_envio.ENVIO_ASSINCRONO:
+        enfileirar_status(statuses)
 
-            print(f"👉 RECEBIDO ({tipo_msg}): {texto}")
-            print("📞 ENVIANDO PARA RESPONDER:", numero)
+    metricas.observar("webhook_lote_tamanho", len(mensagens))
+    metricas.observar("webhook_lote_changes", total_changes)
 
-            responder_oficina(
-                numero=numero,
-                texto_digitado=texto,
-                nome_whatsapp=nome
-            )
+    # Entrega o lote inteiro, em ordem, para a camada de processamento
+    enfileirar_lote(
+        (m.wa_id, processar_mensagem, (m,))
+        for m in mensagens
+    )
 
     return "OK", 200
 
+# ============================================================
+# AQUECE O CACHE DA IMAGEM DO MÊS
+# ============================================================
+if GOOGLE_SHEETS_CONFIGURADO:
+    from responder_oficina import _CACHE_IMAGEM_MES
+    _CACHE_IMAGEM_MES.aquecer()
+
+# ============================================================
+# RETOMA CAMPANHAS INTERROMPIDAS
+# ============================================================
+if os.getenv("CAMPANHA_RETOMAR_AO_INICIAR", "1") == "1":
+    try:
+        disparo_campanha.retomar_campanhas()
+    except Exception as e:
+        log.error("❌ Erro ao retomar campanhas: %s", e)
+
+# ============================================================
+# RETOMA O ENVIO DAS LINHAS DA PLANILHA QUE FICARAM NO OUTBOX
+# ============================================================
+try:
+    sheets_webapp.retomar()
+except Exception as e:
+    log.error("❌ Erro ao retomar o outbox da planilha: %s", e)
+
 # ============================================================
 # RUN
 # ============================================================
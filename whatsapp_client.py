@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+import metricas
+from disjuntor import obter_disjuntor, CircuitoAberto
+from limitador import obter_bucket, deve_retentar, tempo_espera, WA_RETENTATIVAS
+from log_chatbot import obter_logger
+
+load_dotenv()
+
+log = obter_logger("whatsapp")
+
+# ============================================================
+# CONFIGURAÇÃO
+# ============================================================
+
+# Aponte para o graph_falso.py (ex.: http://127.0.0.1:8089) em testes de carga
+GRAPH_API_BASE = os.getenv("GRAPH_API_BASE", "https://graph.facebook.com")
+GRAPH_API_VERSION = os.getenv("GRAPH_API_VERSION", "v20.0")
+WA_TIMEOUT_S = float(os.getenv("WA_TIMEOUT_S", "10"))
+WA_POOL_CONEXOES = int(os.getenv("WA_POOL_CONEXOES", "20"))
+
+
+def _erro_servidor(r):
+    # 5xx: a Graph está com problema, conta como falha para o disjuntor
+    return r.status_code >= 500
+
+# ============================================================
+# CLIENTE DA WHATSAPP CLOUD API (CONEXÕES PERSISTENTES)
+# ============================================================
+
+class WhatsAppClient:
+
+    def __init__(self, token=None, phone_number_id=None, base_url=GRAPH_API_BASE,
+                 versao=GRAPH_API_VERSION, timeout=WA_TIMEOUT_S, pool=WA_POOL_CONEXOES):
+        self.token = token or os.getenv("WA_ACCESS_TOKEN")
+        self.phone_number_id = phone_number_id or os.getenv("WA_PHONE_NUMBER_ID")
+        self.timeout = timeout
+        self.url_base = f"{base_url.rstrip('/')}/{versao}"
+        self.url_mensagens = f"{self.url_base}/{self.phone_number_id}/messages"
+        self.bucket = obter_bucket(self.phone_number_id)
+        self.disjuntor = obter_disjuntor("graph")
+
+        # Uma Session = pool de conexões keep-alive reaproveitado entre envios;
+        # os headers de autenticação são montados uma única vez aqui.
+        self.sessao = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=pool, pool_maxsize=pool)
+        self.sessao.mount("https://", adaptador)
+        self.sessao.mount("http://", adaptador)
+        self.sessao.headers.update({
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+        })
+
+    # ------------------------------------------------------------
+    # MENSAGENS
+    # ------------------------------------------------------------
+
+    def _postar(self, url, retentar=True, **kwargs):
+        # Respeita o orçamento do número e retenta 429/5xx/erros de conexão
+        tentativa = 0
+        while True:
+            # Graph fora do ar: falha na hora e a fila de envio reenvia depois
+            if not self.disjuntor.permitir():
+                metricas.incrementar("wa_envios_falhos")
+                raise CircuitoAberto("graph")
+
+            try:
+                self.bucket.adquirir()
+                r = self.sessao.post(url, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.disjuntor.falha()
+                # Timeout de leitura: a Graph pode já ter aceitado a mensagem,
+                # e repetir o POST duplicaria o envio. Só retenta quando a
+                # conexão nem chegou a ser feita (ConnectTimeout é ConnectionError).
+                lido = isinstance(e, requests.ReadTimeout)
+                if lido or not retentar or tentativa >= WA_RETENTATIVAS:
+                    metricas.incrementar("wa_envios_falhos")
+                    if lido:
+                        metricas.incrementar("wa_timeouts_leitura")
+                    raise
+                espera = tempo_espera(tentativa)
+                log.warning("⚠️ Erro de rede na Graph API (%s), nova tentativa em %.1fs", e, espera)
+            except Exception:
+                # Qualquer outro erro (SSL, resposta truncada, URL inválida)
+                # também conta: senão a chamada de teste do meio-aberto
+                # nunca termina e o disjuntor fica rejeitando tudo
+                self.disjuntor.falha()
+                metricas.incrementar("wa_envios_falhos")
+                raise
+            else:
+                if r.status_code >= 500:
+                    self.disjuntor.falha()
+                else:
+                    self.disjuntor.sucesso()
+
+                if not retentar or not deve_retentar(r.status_code) or tentativa >= WA_RETENTATIVAS:
+                    metricas.incrementar(f"wa_respostas_{r.status_code // 100}xx")
+                    return r
+                espera = tempo_espera(tentativa, r.headers.get("Retry-After"))
+                log.warning(
+                    "⚠️ Graph API respondeu %s, nova tentativa em %.1fs", r.status_code, espera
+                )
+
+            metricas.incrementar("wa_retentativas")
+            tentativa += 1
+            time.sleep(espera)
+
+    def enviar(self, payload):
+        payload.setdefault("messaging_product", "whatsapp")
+        r = self._postar(self.url_mensagens, json=payload)
+
+        if r.status_code >= 400:
+            log.warning(
+                "⚠️ Graph API recusou envio: %s %s",
+                r.status_code, r.text,
+                extra={"dados": {"to": payload.get("to"), "tipo": payload.get("type")}},
+            )
+        return r
+
+    def enviar_bruto(self, corpo):
+        # Corpo JSON já serializado (catálogo de mensagens fixas)
+        r = self._postar(self.url_mensagens, data=corpo)
+
+        if r.status_code >= 400:
+            log.warning("⚠️ Graph API recusou envio pré-serializado: %s %s", r.status_code, r.text)
+        return r
+
+    def enviar_texto(self, numero, texto):
+        return self.enviar({
+            "to": numero,
+            "type": "text",
+            "text": {"body": texto},
+        })
+
+    def enviar_botoes(self, numero, texto, botoes):
+        return self.enviar({
+            "to": numero,
+            "type": "interactive",
+            "interactive": {
+                "type": "button",
+                "body": {"text": texto},
+                "action": {
+                    "buttons": [
+                        {"type": "reply", "reply": {"id": b["id"], "title": b["title"]}}
+                        for b in botoes
+                    ]
+                },
+            },
+        })
+
+    def enviar_imagem(self, numero, link=None, media_id=None):
+        # media_id (upload prévio) evita que a Meta baixe o link a cada envio
+        return self.enviar({
+            "to": numero,
+            "type": "image",
+            "image": {"id": media_id} if media_id else {"link": link},
+        })
+
+    def enviar_template(self, numero, nome, idioma="pt_BR", componentes=None):
+        template = {"name": nome, "language": {"code": idioma}}
+        if componentes:
+            template["components"] = componentes
+
+        return self.enviar({
+            "recipient_type": "individual",
+            "to": numero,
+            "type": "template",
+            "template": template,
+        })
+
+    def marcar_lido(self, message_id, digitando=True):
+        # Melhor esforço: sem retentativa, o indicador só vale por alguns segundos
+        payload = {"messaging_product": "whatsapp", "status": "read", "message_id": message_id}
+        if digitando:
+            payload["typing_indicator"] = {"type": "text"}
+        return self._postar(self.url_mensagens, retentar=False, json=payload)
+
+    # ------------------------------------------------------------
+    # MÍDIA
+    # ------------------------------------------------------------
+
+    def enviar_midia(self, conteudo, mime, nome_arquivo="arquivo"):
+        # Content-Type None: deixa o requests montar o multipart (a sessão usa JSON)
+        r = self._postar(
+            f"{self.url_base}/{self.phone_number_id}/media",
+            data={"messaging_product": "whatsapp", "type": mime},
+            files={"file": (nome_arquivo, conteudo, mime)},
+            headers={"Content-Type": None},
+        )
+        if r.status_code >= 400:
+            log.warning("⚠️ Erro ao subir mídia: %s %s", r.status_code, r.text)
+            return ""
+        return r.json().get("id", "")
+
+    def obter_url_midia(self, media_id):
+        r = self.disjuntor.chamar(
+            self.sessao.get, f"{self.url_base}/{media_id}", timeout=self.timeout, falhou=_erro_servidor
+        )
+        if r.status_code != 200:
+            log.warning("⚠️ Erro ao obter info da mídia: %s %s", r.status_code, r.text)
+            return ""
+        return r.json().get("url", "")
+
+    def baixar_midia(self, url, timeout=30):
+        r = self.disjuntor.chamar(self.sessao.get, url, timeout=timeout, falhou=_erro_servidor)
+        if r.status_code != 200:
+            log.warning("⚠️ Erro ao baixar mídia: %s", r.status_code)
+            return b""
+        return r.content
+
+# ============================================================
+# INSTÂNCIA COMPARTILHADA
+# ============================================================
+
+_CLIENTE = None
+_LOCK = threading.Lock()
+
+
+def obter_cliente():
+    global _CLIENTE
+
+    if _CLIENTE is None:
+        with _LOCK:
+            if _CLIENTE is None:
+                _CLIENTE = WhatsAppClient()
+    return _CLIENTE